@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Aircraft registry: icao24 address -> ICAO type designator
+Airframes are stored as fixed-width records (uint32 address, 4-byte type code)
+sorted by address in a binary file. The file is memory-mapped read-only and
+binary-searched in place, so opening it costs nothing up front and every
+process shares the same page-cache copy. Type codes are joined to
+api/icao-codes.json for display names.
+
+Build it from a CSV with icao24 and typecode columns (e.g. the OpenSky
+aircraft database):
+    python3 api/aircraft_registry.py build aircraftDatabase.csv [--out api/aircraft-registry.bin]
+"""
+
+import argparse
+import csv
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+ICAO_CODES_PATH = os.path.join(API_DIR, 'icao-codes.json')
+DEFAULT_REGISTRY_PATH = os.environ.get('AIRVIEW_AIRCRAFT_REGISTRY', os.path.join(API_DIR, 'aircraft-registry.bin'))
+
+MAGIC = b'AVREG001'
+HEADER = struct.Struct('>8sI')
+RECORD = struct.Struct('>I4s')
+ADDRESS = struct.Struct('>I')
+
+class AircraftRegistry:
+    """Read-only, memory-mapped view of a registry file, mapped on first lookup"""
+
+    def __init__(self, path=DEFAULT_REGISTRY_PATH, icao_codes_path=ICAO_CODES_PATH):
+        self.path = path
+        self.icao_codes_path = icao_codes_path
+        self._map = None
+        self._count = 0
+        self._names = None
+        self._lock = threading.Lock()
+
+    def _records(self):
+        if self._map is None and os.path.exists(self.path):
+            with self._lock:
+                if self._map is None:
+                    with open(self.path, 'rb') as f:
+                        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    magic, count = HEADER.unpack_from(mapped, 0)
+                    if magic != MAGIC or len(mapped) != HEADER.size + count * RECORD.size:
+                        mapped.close()
+                        raise ValueError(f"{self.path} is not an aircraft registry file")
+                    self._count = count
+                    self._map = mapped
+        return self._map
+
+    def __len__(self):
+        return self._count if self._records() is not None else 0
+
+    def lookup(self, icao24):
+        """ICAO type designator (e.g. "A320") for a hex icao24 address, or None"""
+        records = self._records()
+        if records is None or not icao24:
+            return None
+        try:
+            address = int(icao24, 16)
+        except ValueError:
+            return None
+
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            offset = HEADER.size + middle * RECORD.size
+            current = ADDRESS.unpack_from(records, offset)[0]
+            if current < address:
+                low = middle + 1
+            elif current > address:
+                high = middle
+            else:
+                type_code = RECORD.unpack_from(records, offset)[1].rstrip(b' ').decode('ascii')
+                return type_code or None
+        return None
+
+    def lookup_many(self, icao24s):
+        """{icao24: type_code} for the addresses that are registered"""
+        type_codes = {}
+        for icao24 in icao24s:
+            type_code = self.lookup(icao24)
+            if type_code:
+                type_codes[icao24] = type_code
+        return type_codes
+
+    def type_name(self, type_code):
+        """Display name for a type designator from icao-codes.json, falling back to the code itself"""
+        if self._names is None:
+            with open(self.icao_codes_path) as f:
+                self._names = json.load(f)
+        return self._names.get(type_code, type_code)
+
+# Shared by every request this process handles
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_aircraft_registry():
+    """Process-wide AircraftRegistry (the file is not mapped until the first lookup)"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = AircraftRegistry()
+        return _registry
+
+def build_registry(rows, path):
+    """
+    Write (icao24, type_code) rows to a sorted registry file.
+    Invalid addresses and empty or over-long type codes are skipped; a repeated
+    address keeps its last type code. Returns the number of airframes stored.
+    """
+    type_codes = {}
+    for icao24, type_code in rows:
+        type_code = (type_code or '').strip().upper()
+        try:
+            address = int((icao24 or '').strip(), 16)
+        except ValueError:
+            continue
+        if address <= 0xFFFFFF and 0 < len(type_code) <= 4 and type_code.isascii():
+            type_codes[address] = type_code
+
+    temporary = f"{path}.tmp"
+    with open(temporary, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(type_codes)))
+        for address in sorted(type_codes):
+            f.write(RECORD.pack(address, type_codes[address].ljust(4).encode('ascii')))
+    os.replace(temporary, path)
+    return len(type_codes)
+
+def read_registry_csv(path):
+    """Yield (icao24, type_code) from a CSV with icao24 and typecode columns"""
+    with open(path, newline='', encoding='utf-8', errors='replace') as f:
+        for row in csv.DictReader(f):
+            yield row.get('icao24'), row.get('typecode') or row.get('type_code')
+
+def main():
+    """Offline builder for the aircraft registry"""
+    parser = argparse.ArgumentParser(description="Build the icao24 -> aircraft type registry")
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('csv', help="CSV with icao24 and typecode columns")
+    parser.add_argument('--out', default=DEFAULT_REGISTRY_PATH, help="output registry file")
+    args = parser.parse_args()
+
+    count = build_registry(read_registry_csv(args.csv), args.out)
+    print(f"✅ Stored {count} airframes in {args.out}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
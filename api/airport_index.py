@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Nearest-airport spatial index
+Airports are bucketed into a fixed lat/lon grid stored in CSR form (sorted
+cell keys plus start offsets into parallel code/lat/lon arrays), so a lookup
+only measures distances to the airports in the few cells around the query.
+The index is serialized to api/airport-index.json by the builder below and
+loaded once per process.
+
+The bundled api/airport-coords.json only covers ~100 major airports (about
+1% of the codes in api/airport-codes.json); track endpoints near any other
+airport are not matched and fall back to generate_realistic_route. Regenerate
+it for every code in airport-codes.json from an OurAirports airports.csv
+(https://ourairports.com/data/airports.csv):
+    python3 api/airport_index.py build [--csv airports.csv]
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+from bisect import bisect_left
+from math import cos, floor, radians
+
+from geo import haversine_km
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+AIRPORT_COORDS_PATH = os.path.join(API_DIR, 'airport-coords.json')
+AIRPORT_INDEX_PATH = os.path.join(API_DIR, 'airport-index.json')
+AIRPORT_CODES_PATH = os.path.join(API_DIR, 'airport-codes.json')
+
+DEFAULT_CELL_SIZE_DEG = 1.0
+KM_PER_DEGREE = 111.32
+
+class AirportIndex:
+    """Fixed-grid index over airport coordinates answering nearest-airport queries"""
+
+    def __init__(self, codes, lats, lons, cell_keys, cell_starts, cell_size=DEFAULT_CELL_SIZE_DEG):
+        self.codes = codes
+        self.lats = lats
+        self.lons = lons
+        self.cell_keys = cell_keys
+        self.cell_starts = cell_starts
+        self.cell_size = cell_size
+        self.lon_cells = int(round(360.0 / cell_size))
+
+    @classmethod
+    def build(cls, coords, cell_size=DEFAULT_CELL_SIZE_DEG):
+        """Build from {code: [lat, lon]}"""
+        lon_cells = int(round(360.0 / cell_size))
+        entries = sorted(
+            (cls._cell_key(lat, lon, cell_size, lon_cells), code, lat, lon)
+            for code, (lat, lon) in coords.items()
+        )
+
+        cell_keys, cell_starts = [], []
+        for position, (key, _, _, _) in enumerate(entries):
+            if not cell_keys or cell_keys[-1] != key:
+                cell_keys.append(key)
+                cell_starts.append(position)
+        cell_starts.append(len(entries))
+
+        return cls(
+            [entry[1] for entry in entries],
+            [entry[2] for entry in entries],
+            [entry[3] for entry in entries],
+            cell_keys,
+            cell_starts,
+            cell_size
+        )
+
+    @staticmethod
+    def _cell_key(lat, lon, cell_size, lon_cells):
+        row = int(floor((lat + 90.0) / cell_size))
+        column = int(floor((lon + 180.0) / cell_size)) % lon_cells
+        return row * lon_cells + column
+
+    def save(self, path=AIRPORT_INDEX_PATH):
+        """Serialize the index so later processes skip the build"""
+        with open(path, 'w') as f:
+            json.dump({
+                'cell_size': self.cell_size,
+                'cell_keys': self.cell_keys,
+                'cell_starts': self.cell_starts,
+                'codes': self.codes,
+                'lats': self.lats,
+                'lons': self.lons
+            }, f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path=AIRPORT_INDEX_PATH):
+        """Load a serialized index"""
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data['codes'], data['lats'], data['lons'], data['cell_keys'], data['cell_starts'],
+                   data['cell_size'])
+
+    def __len__(self):
+        return len(self.codes)
+
+    def _cell_range(self, key):
+        position = bisect_left(self.cell_keys, key)
+        if position < len(self.cell_keys) and self.cell_keys[position] == key:
+            return self.cell_starts[position], self.cell_starts[position + 1]
+        return 0, 0
+
+    def nearest(self, lat, lon, max_km=10.0):
+        """Return (code, distance_km) of the closest airport within max_km, or None"""
+        lat_span = max_km / KM_PER_DEGREE
+        lon_span = min(180.0, max_km / (KM_PER_DEGREE * max(0.01, cos(radians(lat)))))
+
+        first_row = int(floor((max(-90.0, lat - lat_span) + 90.0) / self.cell_size))
+        last_row = int(floor((min(90.0, lat + lat_span) + 90.0) / self.cell_size))
+        first_column = int(floor((lon - lon_span + 180.0) / self.cell_size))
+        last_column = int(floor((lon + lon_span + 180.0) / self.cell_size))
+        columns = {column % self.lon_cells for column in range(first_column, last_column + 1)}
+
+        best = None
+        best_distance = max_km
+        for row in range(first_row, last_row + 1):
+            for column in columns:
+                start, end = self._cell_range(row * self.lon_cells + column)
+                for i in range(start, end):
+                    distance = haversine_km(lat, lon, self.lats[i], self.lons[i])
+                    if distance <= best_distance:
+                        best, best_distance = self.codes[i], distance
+        return (best, best_distance) if best else None
+
+# Loaded once per process on first use
+_airport_index = None
+_airport_index_lock = threading.Lock()
+
+def load_airport_index():
+    """
+    Return the process-wide index: the serialized one when it is at least as new
+    as the coordinate data, otherwise built from api/airport-coords.json
+    """
+    global _airport_index
+    with _airport_index_lock:
+        if _airport_index is None:
+            if os.path.exists(AIRPORT_INDEX_PATH) and (
+                not os.path.exists(AIRPORT_COORDS_PATH)
+                or os.path.getmtime(AIRPORT_INDEX_PATH) >= os.path.getmtime(AIRPORT_COORDS_PATH)
+            ):
+                _airport_index = AirportIndex.load(AIRPORT_INDEX_PATH)
+            else:
+                with open(AIRPORT_COORDS_PATH) as f:
+                    _airport_index = AirportIndex.build(json.load(f))
+        return _airport_index
+
+def read_ourairports_csv(path, codes=None):
+    """
+    Read {iata_code: [lat, lon]} for scheduled-service airports from an OurAirports
+    airports.csv, keeping only the given codes when there are any
+    """
+    coords = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            code = (row.get('iata_code') or '').strip()
+            if len(code) != 3 or row.get('type') not in ('large_airport', 'medium_airport', 'small_airport'):
+                continue
+            if codes and code not in codes:
+                continue
+            coords[code] = [round(float(row['latitude_deg']), 4), round(float(row['longitude_deg']), 4)]
+    return coords
+
+def main():
+    """Offline builder for the serialized airport index"""
+    parser = argparse.ArgumentParser(description="Build the nearest-airport index")
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--csv', help="OurAirports airports.csv to (re)generate airport-coords.json from")
+    parser.add_argument('--cell-size', type=float, default=DEFAULT_CELL_SIZE_DEG, help="grid cell size in degrees")
+    args = parser.parse_args()
+
+    with open(AIRPORT_CODES_PATH) as f:
+        airport_codes = json.load(f)
+
+    if args.csv:
+        coords = read_ourairports_csv(args.csv, airport_codes)
+        with open(AIRPORT_COORDS_PATH, 'w') as f:
+            f.write('{\n' + ',\n'.join(f'  "{code}": [{lat}, {lon}]' for code, (lat, lon) in sorted(coords.items())) + '\n}\n')
+        print(f"✅ Wrote {len(coords)} airport coordinates to {AIRPORT_COORDS_PATH}", file=sys.stderr)
+    else:
+        with open(AIRPORT_COORDS_PATH) as f:
+            coords = json.load(f)
+
+    covered = len(airport_codes.keys() & coords.keys())
+    print(f"{'✅' if covered * 2 >= len(airport_codes) else '⚠️'} Coordinates cover {covered} of the "
+          f"{len(airport_codes)} codes in {AIRPORT_CODES_PATH}", file=sys.stderr)
+
+    index = AirportIndex.build(coords, args.cell_size)
+    index.save(AIRPORT_INDEX_PATH)
+    print(f"✅ Indexed {len(index)} airports in {len(index.cell_keys)} cells -> {AIRPORT_INDEX_PATH}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Bounded concurrent execution and rate limiting for OpenSky requests
+Per-aircraft enrichment runs on a small thread pool while a token bucket
+keeps the combined request rate inside OpenSky's quotas
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from instrumentation import count, log_debug
+
+# Sustained requests per second and burst size. OpenSky throttles anonymous
+# clients much harder than authenticated ones, so each gets its own default.
+DEFAULT_RATE_LIMITS = {
+    'anonymous': {'requests_per_second': 1.0, 'burst': 4},
+    'authenticated': {'requests_per_second': 4.0, 'burst': 8}
+}
+
+DEFAULT_MAX_IN_FLIGHT = 4
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until a token is available"""
+
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0 or capacity <= 0:
+            raise ValueError("Token bucket rate and capacity must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1):
+        """Block until tokens are available, then take them"""
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait_time = (tokens - self.tokens) / self.rate
+            self._sleep(wait_time)
+
+def token_bucket_for(authenticated, requests_per_second=None, burst=None):
+    """Build a token bucket with OpenSky's defaults for the auth mode, optionally overridden"""
+    defaults = DEFAULT_RATE_LIMITS['authenticated' if authenticated else 'anonymous']
+    return TokenBucket(
+        requests_per_second or defaults['requests_per_second'],
+        burst or defaults['burst']
+    )
+
+def _result_or_default(future, index, default):
+    """Unwrap a finished future, logging and substituting default on failure"""
+    try:
+        return future.result()
+    except Exception as e:
+        count('task_failures_total')
+        log_debug(f"⚠️ Task {index} failed: {e}")
+        return default
+
+def iter_bounded(func, items, max_in_flight=DEFAULT_MAX_IN_FLIGHT, default=None, timeout=None, ordered=True):
+    """
+    Run func over items with at most max_in_flight calls running at once.
+    Yields (index, result) in input order as soon as each prefix is complete,
+    or with ordered=False in completion order as soon as each call finishes.
+    An item whose call raises, or is still running when the overall timeout
+    (seconds) expires, yields default instead of blocking the rest.
+    """
+    items = list(items)
+    if not items:
+        return
+
+    deadline = time.monotonic() + timeout if timeout else None
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_in_flight, len(items))))
+    try:
+        futures = [executor.submit(func, item) for item in items]
+        pending = set(futures)
+        next_index = 0
+
+        if not ordered:
+            indexes = {future: index for index, future in enumerate(futures)}
+            while pending:
+                remaining = deadline - time.monotonic() if deadline else None
+                if remaining is not None and remaining <= 0:
+                    break
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in sorted(done, key=indexes.get):
+                    yield indexes[future], _result_or_default(future, indexes[future], default)
+            for future in sorted(pending, key=indexes.get):
+                count('task_timeouts_total')
+                log_debug(f"⚠️ Task {indexes[future]} timed out after {timeout}s")
+                yield indexes[future], default
+            return
+
+        while next_index < len(futures):
+            remaining = deadline - time.monotonic() if deadline else None
+            if remaining is not None and remaining <= 0:
+                break
+
+            if not futures[next_index].done():
+                _, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                continue
+
+            # Emit every finished future at the head of the queue, in order
+            while next_index < len(futures) and futures[next_index].done():
+                pending.discard(futures[next_index])
+                yield next_index, _result_or_default(futures[next_index], next_index, default)
+                next_index += 1
+
+        # Deadline reached: keep whatever finished, the rest gets the default
+        for index in range(next_index, len(futures)):
+            if futures[index].done():
+                yield index, _result_or_default(futures[index], index, default)
+            else:
+                count('task_timeouts_total')
+                log_debug(f"⚠️ Task {index} timed out after {timeout}s")
+                yield index, default
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Dead-reckoning between upstream polls
+Keeps the last fetched snapshot per area and extrapolates every airborne
+aircraft from its last reported position along its ground track (great
+circle, velocity and vertical rate held constant) to the current time, so the
+display can move smoothly while OpenSky is only polled every minute or two.
+Extrapolation is capped at max_age_s; beyond that positions stay put.
+"""
+
+import json
+import os
+import threading
+import time
+
+from geo import destination_points
+
+KM_PER_NAUTICAL_MILE = 1.852
+
+DEFAULT_POLL_INTERVAL_S = 60
+DEFAULT_MAX_AGE_S = 150
+
+def extrapolate_flights(flights, now=None, max_age_s=DEFAULT_MAX_AGE_S):
+    """
+    Return copies of flights moved to `now` (epoch seconds, default the current time).
+    Position and altitude are extrapolated from time_position (or last_contact) using
+    velocity (knots), true_track and vertical_rate (ft/min) in one batched
+    great-circle pass. Every record gets 'predicted' and 'position_age_s'; records
+    whose age exceeded max_age_s are moved max_age_s only and get 'prediction_capped'.
+    Aircraft on the ground or without a speed and heading are returned unmoved.
+    """
+    now = time.time() if now is None else now
+    predicted = []
+    movable = []
+    for flight in flights:
+        record = dict(flight)
+        reported_at = record.get('time_position') or record.get('last_contact')
+        age_s = max(0.0, now - reported_at) if reported_at else 0.0
+        record['position_age_s'] = round(age_s, 1)
+        record['predicted'] = False
+        predicted.append(record)
+
+        if (age_s > 0 and not record.get('on_ground') and record.get('velocity')
+                and record.get('true_track') is not None
+                and record.get('latitude') is not None and record.get('longitude') is not None):
+            if age_s > max_age_s:
+                record['prediction_capped'] = True
+            movable.append((record, min(age_s, max_age_s)))
+
+    if not movable:
+        return predicted
+
+    lats, lons = destination_points(
+        [record['latitude'] for record, _ in movable],
+        [record['longitude'] for record, _ in movable],
+        [record['true_track'] for record, _ in movable],
+        [record['velocity'] * KM_PER_NAUTICAL_MILE * elapsed_s / 3600.0 for record, elapsed_s in movable]
+    )
+
+    for (record, elapsed_s), lat, lon in zip(movable, lats, lons):
+        record['latitude'] = lat
+        record['longitude'] = lon
+        climb_ft = (record.get('vertical_rate') or 0) * elapsed_s / 60.0
+        if climb_ft:
+            if record.get('altitude'):
+                record['altitude'] = max(0.0, record['altitude'] + climb_ft)
+            if record.get('geo_altitude'):
+                record['geo_altitude'] = max(0.0, record['geo_altitude'] + climb_ft)
+        record['predicted'] = True
+
+    return predicted
+
+class PredictionSnapshot:
+    """The last upstream snapshot for one area and when it was fetched"""
+
+    def __init__(self, flights=None, fetched_at=None):
+        self.flights = flights or []
+        self.fetched_at = fetched_at
+        self.lock = threading.Lock()
+
+    def is_stale(self, now, poll_interval_s=DEFAULT_POLL_INTERVAL_S):
+        """True when a fresh upstream poll is due"""
+        return self.fetched_at is None or now - self.fetched_at >= poll_interval_s
+
+    def update(self, flights, fetched_at):
+        self.flights = flights
+        self.fetched_at = fetched_at
+
+    def save(self, path):
+        """Persist the snapshot so one-shot invocations can predict across processes"""
+        temporary = f"{path}.tmp"
+        with open(temporary, 'w') as f:
+            json.dump({'fetched_at': self.fetched_at, 'flights': self.flights}, f, separators=(',', ':'))
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        """Restore a saved snapshot (an empty, stale one if the file does not exist yet)"""
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data.get('flights'), data.get('fetched_at'))
+
+# Snapshots kept warm by a long-lived process, one per home location / snapshot key
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+def get_prediction_snapshot(key, predict_config=None):
+    """
+    Return the snapshot for a key. With config.predict.path it is loaded from
+    that file on first use (and should be saved back after each poll).
+    """
+    predict_config = predict_config or {}
+    with _snapshots_lock:
+        snapshot = _snapshots.get(key)
+        if snapshot is None:
+            path = predict_config.get('path')
+            snapshot = PredictionSnapshot.load(path) if path else PredictionSnapshot()
+            _snapshots[key] = snapshot
+        return snapshot
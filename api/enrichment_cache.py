@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Persistent per-aircraft enrichment cache
+Stores OpenSky enrichment results (category, track) keyed by icao24 in SQLite
+so they survive process restarts. Each field has its own TTL and the table is
+bounded with least-recently-used eviction.
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from instrumentation import count, log_info
+
+DEFAULT_CACHE_PATH = os.path.join(tempfile.gettempdir(), 'airview-enrichment-cache.sqlite')
+
+# Category is a property of the airframe and practically never changes;
+# tracks grow while the aircraft is airborne and need regular refreshing.
+DEFAULT_TTLS = {
+    'category': 7 * 24 * 3600,
+    'track': 60
+}
+
+DEFAULT_MAX_ENTRIES = 50000
+
+class EnrichmentCache:
+    """SQLite-backed TTL/LRU cache of enrichment fields keyed by (icao24, field)"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttls=None, max_entries=DEFAULT_MAX_ENTRIES, clock=time.time):
+        self.path = path
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS enrichment (
+                icao24 TEXT NOT NULL,
+                field TEXT NOT NULL,
+                value TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (icao24, field)
+            ) WITHOUT ROWID
+        ''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS enrichment_last_used ON enrichment (last_used)')
+
+    def get(self, icao24, field):
+        """Return the cached value, or None when missing or older than the field's TTL"""
+        return self.get_many([icao24], field).get(icao24.lower())
+
+    def get_many(self, icao24s, field):
+        """Return {icao24: value} for every fresh cached entry among icao24s"""
+        keys = [icao.lower() for icao in icao24s]
+        if not keys:
+            return {}
+
+        now = self._clock()
+        oldest = now - self.ttls[field]
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT icao24, value FROM enrichment WHERE field = ? AND fetched_at >= ? "
+                    f"AND icao24 IN ({','.join('?' * len(chunk))})",
+                    [field, oldest] + chunk
+                ).fetchall()
+                found.update((icao, json.loads(value)) for icao, value in rows)
+
+            if found:
+                self._db.executemany(
+                    "UPDATE enrichment SET last_used = ? WHERE icao24 = ? AND field = ?",
+                    [(now, icao, field) for icao in found]
+                )
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        count('cache_hits_total', len(found), field=field)
+        count('cache_misses_total', len(keys) - len(found), field=field)
+        return found
+
+    def put(self, icao24, field, value):
+        """Store one value"""
+        self.put_many({icao24: value}, field)
+
+    def put_many(self, values, field):
+        """Store {icao24: value} for one field, evicting least-recently-used entries past max_entries"""
+        if not values:
+            return
+
+        now = self._clock()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO enrichment (icao24, field, value, fetched_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                [(icao.lower(), field, json.dumps(value), now, now) for icao, value in values.items()]
+            )
+            self._evict()
+
+    def _evict(self):
+        count = self._db.execute("SELECT COUNT(*) FROM enrichment").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM enrichment WHERE (icao24, field) IN "
+                "(SELECT icao24, field FROM enrichment ORDER BY last_used LIMIT ?)",
+                (excess,)
+            )
+            self.evictions += excess
+
+    def stats(self):
+        """Counters since this process opened the cache"""
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM enrichment").fetchone()[0]
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': entries
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+# Opened caches, shared by every request a long-lived process handles
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_enrichment_cache(cache_config):
+    """
+    Return the shared cache described by config.cache, or None when caching is off.
+    Caching is on when config.cache is given or AIRVIEW_CACHE_PATH is set.
+    """
+    if cache_config is None and not os.environ.get('AIRVIEW_CACHE_PATH'):
+        return None
+    cache_config = cache_config or {}
+    if cache_config.get('enabled') is False:
+        return None
+
+    path = cache_config.get('path') or os.environ.get('AIRVIEW_CACHE_PATH') or DEFAULT_CACHE_PATH
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            ttls = {
+                field: cache_config[f"{field}_ttl_s"]
+                for field in DEFAULT_TTLS
+                if f"{field}_ttl_s" in cache_config
+            }
+            cache = EnrichmentCache(path, ttls, cache_config.get('max_entries', DEFAULT_MAX_ENTRIES))
+            _caches[path] = cache
+            log_info(f"🗄️ Enrichment cache opened at {path}")
+        return cache
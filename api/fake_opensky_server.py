@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenSky REST API
+Serves synthetic /states/all and /tracks/all responses, or replays a recorded
+snapshot, with configurable latency and error rate so the enhancer can be
+exercised without credits.
+Point the enhancer at it with config.opensky.api_url = "http://127.0.0.1:<port>/api"
+
+Record a real snapshot (one states/all answer plus tracks for its first aircraft):
+    python3 api/fake_opensky_server.py --record snapshot.json --bbox 38.9,40.8,-105.9,-103.4
+and replay it with --replay snapshot.json. --replay also takes a recording
+directory written by api/state_recorder.py: its polls are served in recorded
+order, --speed times faster than they were recorded, looping at the end.
+"""
+
+import argparse
+import base64
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.parse import parse_qs, urlencode, urlparse
+from urllib.request import Request, urlopen
+
+from state_recorder import StateRecording
+
+OPENSKY_API_URL = 'https://opensky-network.org/api'
+
+def synthetic_states(count, center_lat=39.8561, center_lon=-104.6737, spread_deg=1.0, seed=42, timestamp=None):
+    """Generate OpenSky-shaped state vector arrays scattered around a center point"""
+    rng = random.Random(seed)
+    timestamp = int(timestamp or time.time())
+    callsign_prefixes = ['UAL', 'AAL', 'DAL', 'SWA', 'FFT', 'JBU', 'ASA', 'SKW']
+    states = []
+    for i in range(count):
+        on_ground = rng.random() < 0.1
+        baro_altitude = None if rng.random() < 0.05 else rng.uniform(0, 12500)
+        states.append([
+            f"{0xa00000 + i:06x}",                                            # icao24
+            f"{rng.choice(callsign_prefixes)}{rng.randint(1, 9999)}".ljust(8),  # callsign
+            'United States',                                                 # origin_country
+            timestamp - rng.randint(0, 15),                                   # time_position
+            timestamp,                                                       # last_contact
+            center_lon + rng.uniform(-spread_deg, spread_deg),                # longitude
+            None if rng.random() < 0.02 else center_lat + rng.uniform(-spread_deg, spread_deg),  # latitude
+            baro_altitude,                                                   # baro_altitude
+            on_ground,                                                       # on_ground
+            rng.uniform(0, 280),                                             # velocity
+            rng.uniform(0, 360),                                             # true_track
+            rng.uniform(-15, 15),                                            # vertical_rate
+            None,                                                            # sensors
+            baro_altitude + 100 if baro_altitude is not None else None,      # geo_altitude
+            f"{rng.randint(0, 7777):04d}",                                   # squawk
+            False,                                                           # spi
+            0,                                                               # position_source
+            rng.choice([0, 0, 0, 3, 4, 6])                                   # category
+        ])
+    return states
+
+def synthetic_track(icao24, points=60, start_lat=39.8561, start_lon=-104.6737, timestamp=None):
+    """Generate an OpenSky-shaped track that takes off from the start point"""
+    timestamp = int(timestamp or time.time())
+    rng = random.Random(icao24)
+    heading_lat = rng.uniform(-0.02, 0.02)
+    heading_lon = rng.uniform(-0.02, 0.02)
+    path = []
+    for i in range(points):
+        on_ground = i < 2
+        path.append([
+            timestamp - (points - i) * 30,
+            start_lat + heading_lat * i,
+            start_lon + heading_lon * i,
+            0 if on_ground else min(11000, 300 * i),
+            rng.uniform(0, 360),
+            on_ground
+        ])
+    return {
+        'icao24': icao24,
+        'callsign': None,
+        'startTime': path[0][0],
+        'endTime': path[-1][0],
+        'path': path
+    }
+
+class FakeOpenSkyServer(ThreadingHTTPServer):
+    """HTTP server holding the fake API's configuration and request counters"""
+
+    daemon_threads = True
+    # The default backlog of 5 drops connections under concurrent fetches (a 1s SYN retry each)
+    request_queue_size = 128
+
+    def __init__(self, address, aircraft=200, latency_ms=0, error_rate=0.0, seed=42, replay=None, speed=1.0):
+        super().__init__(address, FakeOpenSkyHandler)
+        self.aircraft = aircraft
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.stats = {'requests': 0, 'states': 0, 'tracks': 0, 'errors': 0}
+        self.stats_lock = threading.Lock()
+        self.recording = load_recording(replay) if replay else None
+        self.speed = speed
+        # Pin a poll of a state recording (None = advance with the clock at self.speed)
+        self.replay_position = None
+        self.started_at = time.time()
+        self._synthetic = (None, None, None)
+        self._recorded_poll = (None, None)
+
+    @property
+    def api_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api"
+
+    def count(self, key):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+    def snapshot_stats(self):
+        """Copy of the request counters (diff two copies to count one run's upstream calls)"""
+        with self.stats_lock:
+            return dict(self.stats)
+
+    def states(self):
+        """
+        Every state row the fake API knows about: the recording, or synthetic aircraft.
+        Report times are shifted so the rows always look freshly reported.
+        """
+        if isinstance(self.recording, StateRecording):
+            states, generated_at = self.recorded_poll()
+        elif self.recording:
+            states, generated_at = self.recording['states'], self.recording.get('time')
+        else:
+            # Generating tens of thousands of rows per request would dominate the timings
+            count, states, generated_at = self._synthetic
+            if count != self.aircraft:
+                generated_at = int(time.time())
+                states = synthetic_states(self.aircraft, timestamp=generated_at)
+                self._synthetic = (self.aircraft, states, generated_at)
+
+        shift = int(time.time()) - generated_at if generated_at else 0
+        if not shift:
+            return states
+        return [
+            row[:3] + [row[3] + shift if row[3] is not None else None, row[4] + shift] + row[5:]
+            for row in states
+        ]
+
+    def recorded_poll(self):
+        """(rows, recorded_at) of the state recording's current poll"""
+        polls = self.recording.refresh()
+        if not polls:
+            return [], None
+        position = self.replay_position
+        if position is None:
+            first, last = self.recording.time_range()
+            elapsed = (time.time() - self.started_at) * self.speed
+            position = max(0, self.recording.find(first + elapsed % max(last - first, 1.0) + 1e-6) - 1)
+        position = min(position, polls - 1)
+
+        # Decoding a poll costs a struct unpack per value; keep the current one
+        cached_position, cached = self._recorded_poll
+        if cached_position != position:
+            cached = (self.recording.rows(position), int(self.recording.snapshot(position)[0]))
+            self._recorded_poll = (position, cached)
+        return cached
+
+    def track(self, icao24):
+        """Track for one aircraft, or None when a recording has none for it"""
+        if isinstance(self.recording, StateRecording):
+            return synthetic_track(icao24)
+        if self.recording:
+            return self.recording['tracks'].get(icao24)
+        return synthetic_track(icao24)
+
+class FakeOpenSkyHandler(BaseHTTPRequestHandler):
+    """Answers the subset of the OpenSky API used by the enhancers"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.count('requests')
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+
+        if server.latency_ms:
+            time.sleep(server.latency_ms / 1000.0)
+
+        if server.error_rate and server.rng.random() < server.error_rate:
+            server.count('errors')
+            self._send_json(503, {'error': 'injected failure'})
+            return
+
+        if url.path.endswith('/states/all'):
+            server.count('states')
+            states = server.states()
+            if 'icao24' in params:
+                wanted = set(params['icao24'])
+                states = [state for state in states if state[0] in wanted]
+            if 'lamin' in params:
+                lamin, lamax = float(params['lamin'][0]), float(params['lamax'][0])
+                lomin, lomax = float(params['lomin'][0]), float(params['lomax'][0])
+                states = [
+                    state for state in states
+                    if state[6] is not None and lamin <= state[6] <= lamax and lomin <= state[5] <= lomax
+                ]
+            self._send_json(200, {'time': int(time.time()), 'states': states})
+        elif url.path.endswith('/tracks/all'):
+            server.count('tracks')
+            track = server.track(params.get('icao24', [''])[0])
+            if track is None:
+                self._send_json(404, {'error': 'no track'})
+            else:
+                self._send_json(200, track)
+        else:
+            self._send_json(404, {'error': f"unknown endpoint {url.path}"})
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+def load_recording(path):
+    """Read a snapshot written by record_snapshot, or open a state recording directory"""
+    if os.path.isdir(path):
+        return StateRecording(path)
+    with open(path) as f:
+        recording = json.load(f)
+    recording.setdefault('tracks', {})
+    return recording
+
+def _get_json(url, auth=None):
+    request = Request(url)
+    if auth:
+        credentials = base64.b64encode(f"{auth[0]}:{auth[1]}".encode('utf-8')).decode('ascii')
+        request.add_header('Authorization', f"Basic {credentials}")
+    try:
+        with urlopen(request, timeout=30) as response:
+            return json.load(response)
+    except HTTPError as error:
+        print(f"⚠️ {url} answered {error.code}", file=sys.stderr)
+        return None
+
+def record_snapshot(path, bbox, tracks=20, api_url=OPENSKY_API_URL, auth=None):
+    """
+    Capture one states/all answer for bbox (lamin, lamax, lomin, lomax) plus the
+    tracks of up to `tracks` of its aircraft into a replayable JSON file.
+    Returns (state count, track count).
+    """
+    lamin, lamax, lomin, lomax = bbox
+    query = urlencode({'lamin': lamin, 'lamax': lamax, 'lomin': lomin, 'lomax': lomax})
+    snapshot = _get_json(f"{api_url}/states/all?{query}", auth) or {}
+    states = snapshot.get('states') or []
+
+    recorded_tracks = {}
+    for state in states[:tracks]:
+        track = _get_json(f"{api_url}/tracks/all?{urlencode({'icao24': state[0], 'time': 0})}", auth)
+        if track:
+            recorded_tracks[state[0]] = track
+
+    with open(path, 'w') as f:
+        json.dump({'time': snapshot.get('time'), 'states': states, 'tracks': recorded_tracks}, f)
+    return len(states), len(recorded_tracks)
+
+def start_fake_opensky_server(port=0, **options):
+    """Start the fake API on a background thread and return the server (see .api_url, .stats)"""
+    server = FakeOpenSkyServer(('127.0.0.1', port), **options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+def main():
+    """Run the fake API in the foreground"""
+    parser = argparse.ArgumentParser(description="Local fake OpenSky API")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--aircraft', type=int, default=200, help="number of synthetic aircraft")
+    parser.add_argument('--latency-ms', type=float, default=0, help="delay added to every response")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument('--replay', help="serve a snapshot recorded with --record (or a state recording directory)"
+                                         " instead of synthetic aircraft")
+    parser.add_argument('--speed', type=float, default=1.0, help="replay speed-up for state recordings")
+    parser.add_argument('--record', help="record a snapshot from --upstream to this file and exit")
+    parser.add_argument('--upstream', default=OPENSKY_API_URL, help="API to record from")
+    parser.add_argument('--bbox', default='38.9,40.8,-105.9,-103.4', help="lamin,lamax,lomin,lomax to record")
+    parser.add_argument('--tracks', type=int, default=20, help="number of tracks to record")
+    parser.add_argument('--username', help="OpenSky username for recording")
+    parser.add_argument('--password', help="OpenSky password for recording")
+    args = parser.parse_args()
+
+    if args.record:
+        auth = (args.username, args.password) if args.username and args.password else None
+        bbox = [float(value) for value in args.bbox.split(',')]
+        states, tracks = record_snapshot(args.record, bbox, args.tracks, args.upstream.rstrip('/'), auth)
+        print(f"✅ Recorded {states} states and {tracks} tracks to {args.record}", file=sys.stderr)
+        return
+
+    server = FakeOpenSkyServer(('127.0.0.1', args.port), aircraft=args.aircraft,
+                               latency_ms=args.latency_ms, error_rate=args.error_rate, replay=args.replay,
+                               speed=args.speed)
+    print(f"🛩️ Fake OpenSky API listening on {server.api_url}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
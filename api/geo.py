@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Great-circle helpers shared by the Python enhancers
+Scalar functions for single points plus batch versions that use NumPy
+when it is installed and fall back to a plain loop otherwise.
+"""
+
+from math import asin, atan2, cos, degrees, radians, sin, sqrt
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+EARTH_RADIUS_KM = 6371.0088
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometers"""
+    phi1, phi2 = radians(lat1), radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = radians(lon2 - lon1)
+    a = sin(dphi / 2) ** 2 + cos(phi1) * cos(phi2) * sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(a)))
+
+def initial_bearing_deg(lat1, lon1, lat2, lon2):
+    """Initial compass bearing from point 1 to point 2, 0-360 degrees"""
+    phi1, phi2 = radians(lat1), radians(lat2)
+    dlambda = radians(lon2 - lon1)
+    y = sin(dlambda) * cos(phi2)
+    x = cos(phi1) * sin(phi2) - sin(phi1) * cos(phi2) * cos(dlambda)
+    return (degrees(atan2(y, x)) + 360.0) % 360.0
+
+def destination_point(lat, lon, bearing_deg, distance_km):
+    """Point reached by travelling distance_km from (lat, lon) on an initial bearing, as (lat, lon)"""
+    phi1, lambda1 = radians(lat), radians(lon)
+    theta = radians(bearing_deg)
+    delta = distance_km / EARTH_RADIUS_KM
+    phi2 = asin(max(-1.0, min(1.0, sin(phi1) * cos(delta) + cos(phi1) * sin(delta) * cos(theta))))
+    lambda2 = lambda1 + atan2(sin(theta) * sin(delta) * cos(phi1), cos(delta) - sin(phi1) * sin(phi2))
+    return degrees(phi2), (degrees(lambda2) + 540.0) % 360.0 - 180.0
+
+def destination_points(lats, lons, bearings_deg, distances_km):
+    """destination_point for many points at once, as (lats, lons) lists"""
+    if not lats:
+        return [], []
+
+    if not NUMPY_AVAILABLE:
+        points = [destination_point(*args) for args in zip(lats, lons, bearings_deg, distances_km)]
+        return [point[0] for point in points], [point[1] for point in points]
+
+    phi1 = np.radians(np.asarray(lats, dtype=float))
+    lambda1 = np.radians(np.asarray(lons, dtype=float))
+    theta = np.radians(np.asarray(bearings_deg, dtype=float))
+    delta = np.asarray(distances_km, dtype=float) / EARTH_RADIUS_KM
+
+    phi2 = np.arcsin(np.clip(np.sin(phi1) * np.cos(delta) + np.cos(phi1) * np.sin(delta) * np.cos(theta), -1.0, 1.0))
+    lambda2 = lambda1 + np.arctan2(np.sin(theta) * np.sin(delta) * np.cos(phi1),
+                                   np.cos(delta) - np.sin(phi1) * np.sin(phi2))
+
+    return np.degrees(phi2).tolist(), ((np.degrees(lambda2) + 540.0) % 360.0 - 180.0).tolist()
+
+def distances_and_bearings(lat, lon, lats, lons):
+    """Distance (km) and bearing (degrees) from one point to many, as two lists"""
+    if not lats:
+        return [], []
+
+    if not NUMPY_AVAILABLE:
+        return (
+            [haversine_km(lat, lon, plat, plon) for plat, plon in zip(lats, lons)],
+            [initial_bearing_deg(lat, lon, plat, plon) for plat, plon in zip(lats, lons)]
+        )
+
+    distance, bearing = distance_bearing_arrays(lat, lon, lats, lons)
+    return distance.tolist(), bearing.tolist()
+
+def distance_bearing_arrays(lat, lon, lats, lons):
+    """NumPy distances (km) and bearings (degrees) from one point to many, as arrays"""
+    phi1 = np.radians(lat)
+    phi2 = np.radians(np.asarray(lats, dtype=float))
+    dphi = phi2 - phi1
+    dlambda = np.radians(np.asarray(lons, dtype=float) - lon)
+
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    distance = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+    y = np.sin(dlambda) * np.cos(phi2)
+    x = np.cos(phi1) * np.sin(phi2) - np.sin(phi1) * np.cos(phi2) * np.cos(dlambda)
+    bearing = (np.degrees(np.arctan2(y, x)) + 360.0) % 360.0
+
+    return distance, bearing
+
+def rank_by_distance(flights, lat, lon, radius_km, limit=None):
+    """
+    Keep flights inside the true radius_km circle around (lat, lon), annotate them
+    with distance_km/bearing, and return them nearest first (at most limit of them).
+    get_bounding_box is a rectangle, so its corners reach ~41% past the radius.
+    """
+    if not flights:
+        return []
+
+    distances, bearings = distances_and_bearings(
+        lat, lon,
+        [flight['latitude'] for flight in flights],
+        [flight['longitude'] for flight in flights]
+    )
+
+    ranked = []
+    for flight, distance, bearing in zip(flights, distances, bearings):
+        if distance <= radius_km:
+            flight['distance_km'] = round(distance, 2)
+            flight['bearing'] = round(bearing, 1)
+            ranked.append(flight)
+
+    ranked.sort(key=lambda flight: flight['distance_km'])
+    return ranked[:limit] if limit else ranked
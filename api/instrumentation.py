@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Instrumentation for the Python enhancers
+Leveled stderr logging, named timing spans, counters, gauges and latency histograms
+kept in one process-wide registry, plus an on-demand cProfile hook.
+Per-flight log lines are 'debug', so any lower level switches them off
+entirely while the metrics keep counting. Metrics export as a JSON trailer
+(Metrics.to_dict) or Prometheus text format (Metrics.write_prometheus); both
+are cumulative since the process started.
+
+    AIRVIEW_LOG_LEVEL=quiet|error|warning|info|debug   (default debug)
+    AIRVIEW_PROFILE=/path/to/enhancer.prof             (cProfile stats file)
+"""
+
+import cProfile
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+LOG_LEVELS = {'quiet': 0, 'error': 1, 'warning': 2, 'info': 3, 'debug': 4}
+DEFAULT_LOG_LEVEL = 'debug'
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRIC_PREFIX = 'airview_'
+
+_log_level = LOG_LEVELS.get(os.environ.get('AIRVIEW_LOG_LEVEL', DEFAULT_LOG_LEVEL), LOG_LEVELS[DEFAULT_LOG_LEVEL])
+
+def set_log_level(name):
+    """Set the process-wide log level by name"""
+    global _log_level
+    if name not in LOG_LEVELS:
+        raise ValueError(f"Unknown log level '{name}' (expected one of {', '.join(LOG_LEVELS)})")
+    _log_level = LOG_LEVELS[name]
+
+def log_error(message):
+    if _log_level >= 1:
+        print(message, file=sys.stderr)
+
+def log_warning(message):
+    if _log_level >= 2:
+        print(message, file=sys.stderr)
+
+def log_info(message):
+    if _log_level >= 3:
+        print(message, file=sys.stderr)
+
+def log_debug(message):
+    """Per-flight detail; only printed at the debug level"""
+    if _log_level >= 4:
+        print(message, file=sys.stderr)
+
+class Histogram:
+    """Fixed-bucket latency histogram (seconds)"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        position = 0
+        while position < len(self.buckets) and seconds > self.buckets[position]:
+            position += 1
+        self.counts[position] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def cumulative(self):
+        """[(upper_bound, observations <= bound)], ending with +Inf"""
+        total = 0
+        result = []
+        for bound, count in zip(list(self.buckets) + [float('inf')], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, fraction):
+        """Upper bound of the bucket holding the given quantile (None when empty or past the last bucket)"""
+        if not self.count:
+            return None
+        wanted = fraction * self.count
+        for bound, total in self.cumulative():
+            if total >= wanted:
+                return bound if bound != float('inf') else None
+        return None
+
+    def to_dict(self):
+        quantile_ms = {}
+        for name, fraction in (('p50_ms', 0.5), ('p95_ms', 0.95), ('p99_ms', 0.99)):
+            bound = self.quantile(fraction)
+            quantile_ms[name] = round(bound * 1000.0, 1) if bound is not None else None
+        return dict({
+            'count': self.count,
+            'sum_s': round(self.sum, 6),
+            'mean_ms': round(self.sum / self.count * 1000.0, 3) if self.count else None
+        }, **quantile_ms)
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _label_text(key):
+    return ','.join(f'{name}="{value}"' for name, value in key)
+
+class Metrics:
+    """Thread-safe counters, gauges and histograms keyed by name and labels"""
+
+    def __init__(self):
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """Set a gauge to its current value"""
+        with self._lock:
+            self.gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def span(self, stage):
+        """Time a named stage into the stage_seconds histogram"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('stage_seconds', time.perf_counter() - start, stage=stage)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+    def to_dict(self):
+        """{'counters'|'gauges': {name: {labels: value}}, 'histograms': {name: {labels: summary}}}"""
+        with self._lock:
+            counters, gauges, histograms = {}, {}, {}
+            for (name, key), value in sorted(self.counters.items()):
+                counters.setdefault(name, {})[_label_text(key)] = value
+            for (name, key), value in sorted(self.gauges.items()):
+                gauges.setdefault(name, {})[_label_text(key)] = value
+            for (name, key), histogram in sorted(self.histograms.items()):
+                histograms.setdefault(name, {})[_label_text(key)] = histogram.to_dict()
+        return {'counters': counters, 'gauges': gauges, 'histograms': histograms}
+
+    def to_prometheus(self):
+        """Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            typed = set()
+            for kind, values in (('counter', self.counters), ('gauge', self.gauges)):
+                for (name, key), value in sorted(values.items()):
+                    metric = METRIC_PREFIX + name
+                    if metric not in typed:
+                        lines.append(f"# TYPE {metric} {kind}")
+                        typed.add(metric)
+                    lines.append(f"{metric}{{{_label_text(key)}}} {value}" if key else f"{metric} {value}")
+
+            for (name, key), histogram in sorted(self.histograms.items()):
+                metric = METRIC_PREFIX + name
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} histogram")
+                    typed.add(metric)
+                labels = _label_text(key)
+                prefix = f"{labels}," if labels else ''
+                for bound, total in histogram.cumulative():
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{metric}_bucket{{{prefix}le="{le}"}} {total}')
+                suffix = f"{{{labels}}}" if labels else ''
+                lines.append(f"{metric}_sum{suffix} {histogram.sum:.6f}")
+                lines.append(f"{metric}_count{suffix} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """Atomically replace a Prometheus textfile (e.g. for node_exporter's textfile collector)"""
+        temporary = f"{path}.tmp"
+        with open(temporary, 'w') as f:
+            f.write(self.to_prometheus())
+        os.replace(temporary, path)
+
+# Process-wide registry every module records into
+METRICS = Metrics()
+
+def span(stage):
+    return METRICS.span(stage)
+
+def count(name, value=1, **labels):
+    METRICS.inc(name, value, **labels)
+
+def gauge(name, value, **labels):
+    METRICS.set(name, value, **labels)
+
+def observe(name, seconds, **labels):
+    METRICS.observe(name, seconds, **labels)
+
+@contextmanager
+def profiled(path=None):
+    """Run the block under cProfile and dump stats to path (or AIRVIEW_PROFILE); no-op when neither is set"""
+    path = path or os.environ.get('AIRVIEW_PROFILE')
+    if not path:
+        yield
+        return
+
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
+        log_info(f"📈 Profile written to {path} (inspect with: python3 -m pstats {path})")
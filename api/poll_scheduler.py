@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Adaptive upstream poll scheduling
+Picks the interval until the next fetch_opensky_flights call for one area from
+what the last poll returned: back off while the area is empty or unchanged,
+tighten while aircraft close in on the home point, and never poll faster than
+the account's daily OpenSky credit budget allows. OpenSky bills a states/all
+call by bbox area and resets credits daily at 00:00 UTC.
+
+Every decision is exported as metrics. The clock is injectable, so a whole
+day can be replayed in milliseconds:
+    python3 api/poll_scheduler.py simulate [--hours 24] [--radius-km 75] [--daily-credits 400]
+"""
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from math import cos, pi, radians
+
+from instrumentation import count, gauge, log_info
+
+# (upper bound of bbox area in square degrees, credits per states/all call)
+CREDIT_TIERS = ((25.0, 1), (100.0, 2), (400.0, 3))
+MAX_CREDIT_COST = 4
+
+DAILY_CREDITS = {'anonymous': 400, 'authenticated': 4000}
+SECONDS_PER_DAY = 86400
+
+DEFAULT_SCHEDULE = {
+    'min_interval_s': 10.0,
+    'base_interval_s': 60.0,
+    'max_interval_s': 600.0,
+    'backoff_factor': 2.0,
+    # Nearest aircraft inside this distance polls at min_interval_s
+    'approach_km': 25.0
+}
+
+def bbox_area_sq_deg(bbox):
+    return max(0.0, bbox['lamax'] - bbox['lamin']) * max(0.0, bbox['lomax'] - bbox['lomin'])
+
+def credit_cost(bbox):
+    """OpenSky credits for one states/all call over bbox (lamin/lamax/lomin/lomax)"""
+    area = bbox_area_sq_deg(bbox)
+    for upper_bound, credits in CREDIT_TIERS:
+        if area <= upper_bound:
+            return credits
+    return MAX_CREDIT_COST
+
+class SimulatedClock:
+    """Callable stand-in for time.time that only moves when told to"""
+
+    def __init__(self, start=0.0):
+        self.now = float(start)
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+        return self.now
+
+class CreditBudget:
+    """Daily OpenSky credits for one account, shared by every area it polls"""
+
+    def __init__(self, daily_credits, name='anonymous', clock=time.time):
+        self.daily_credits = daily_credits
+        self.name = name
+        self.clock = clock
+        self.day = None
+        self.spent = 0
+        self.areas = set()
+        self.lock = threading.Lock()
+
+    def _roll(self, now):
+        day = int(now // SECONDS_PER_DAY)
+        if day != self.day:
+            self.day, self.spent = day, 0
+
+    def remaining(self, now=None):
+        with self.lock:
+            self._roll(self.clock() if now is None else now)
+            return max(0, self.daily_credits - self.spent)
+
+    def spend(self, credits, now=None):
+        with self.lock:
+            self._roll(self.clock() if now is None else now)
+            self.spent += credits
+            remaining = max(0, self.daily_credits - self.spent)
+        count('poll_credits_spent_total', credits, account=self.name)
+        gauge('poll_credits_remaining', remaining, account=self.name)
+        return remaining
+
+    def seconds_until_reset(self, now):
+        return (int(now // SECONDS_PER_DAY) + 1) * SECONDS_PER_DAY - now
+
+class PollScheduler:
+    """Next-poll decisions for one area"""
+
+    def __init__(self, key, cost, budget, options=None, clock=None):
+        self.key = key
+        self.cost = cost
+        self.budget = budget
+        self.settings = dict(DEFAULT_SCHEDULE, **(options or {}))
+        self.clock = clock or budget.clock
+        self.interval_s = self.settings['base_interval_s']
+        self.reason = 'initial'
+        self.budget_limited = False
+        self.next_poll_at = None
+        self.last_icaos = None
+        self.last_nearest_km = None
+        self.last_flights = []
+        self.lock = threading.Lock()
+        budget.areas.add(key)
+
+    def is_due(self, now=None):
+        """True when the next poll time has passed and the budget still covers a poll"""
+        now = self.clock() if now is None else now
+        if self.budget.remaining(now) < self.cost:
+            return False
+        return self.next_poll_at is None or now >= self.next_poll_at
+
+    def _traffic_interval(self, flights):
+        """Interval and reason from what the poll returned (flights carry distance_km)"""
+        settings = self.settings
+        backoff = min(settings['max_interval_s'],
+                      max(settings['base_interval_s'], self.interval_s) * settings['backoff_factor'])
+        if not flights:
+            return backoff, 'empty', None
+
+        icaos = frozenset(flight['icao24'] for flight in flights)
+        nearest_km = min((flight['distance_km'] for flight in flights if flight.get('distance_km') is not None),
+                         default=None)
+        if nearest_km is not None and nearest_km <= settings['approach_km']:
+            return settings['min_interval_s'], 'approaching', nearest_km
+        if nearest_km is not None and self.last_nearest_km is not None and nearest_km < self.last_nearest_km - 1.0:
+            return max(settings['min_interval_s'], settings['base_interval_s'] / 2), 'closing', nearest_km
+        if icaos == self.last_icaos:
+            return backoff, 'unchanged', nearest_km
+        return settings['base_interval_s'], 'traffic', nearest_km
+
+    def _budget_interval(self, now):
+        """Shortest interval that makes this area's share of the remaining credits last until the reset"""
+        seconds_left = self.budget.seconds_until_reset(now)
+        polls_left = self.budget.remaining(now) // (self.cost * max(1, len(self.budget.areas)))
+        return seconds_left / polls_left if polls_left else seconds_left
+
+    def record_poll(self, flights, now=None):
+        """Spend the poll's credits, look at what it returned and schedule the next one"""
+        now = self.clock() if now is None else now
+        self.budget.spend(self.cost, now)
+        with self.lock:
+            interval, reason, nearest_km = self._traffic_interval(flights)
+            budget_interval = self._budget_interval(now)
+            self.budget_limited = budget_interval > interval
+            self.interval_s = max(interval, budget_interval)
+            self.reason = reason
+            self.next_poll_at = now + self.interval_s
+            self.last_icaos = frozenset(flight['icao24'] for flight in flights)
+            self.last_nearest_km = nearest_km
+            self.last_flights = list(flights)
+
+        count('poll_decisions_total', reason='budget' if self.budget_limited else reason)
+        gauge('poll_interval_seconds', round(self.interval_s, 1), area=self.key)
+        return self.state(now)
+
+    def state(self, now=None):
+        """The latest decision and budget, as reported to callers"""
+        now = self.clock() if now is None else now
+        return {
+            'interval_s': round(self.interval_s, 1),
+            'reason': self.reason,
+            'budget_limited': self.budget_limited,
+            'next_poll_in_s': round(max(0.0, self.next_poll_at - now), 1) if self.next_poll_at else 0.0,
+            'credit_cost': self.cost,
+            'credits_remaining': self.budget.remaining(now),
+            'daily_credits': self.budget.daily_credits
+        }
+
+    def save(self, path):
+        """Persist the schedule and today's spend so one-shot invocations share them"""
+        data = {
+            'interval_s': self.interval_s,
+            'reason': self.reason,
+            'next_poll_at': self.next_poll_at,
+            'last_icaos': sorted(self.last_icaos or []),
+            'last_nearest_km': self.last_nearest_km,
+            'last_flights': self.last_flights,
+            'budget_day': self.budget.day,
+            'budget_spent': self.budget.spent
+        }
+        temporary = f"{path}.tmp"
+        with open(temporary, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(temporary, path)
+
+    def restore(self, path):
+        """Load a schedule written by save (no-op when the file does not exist yet)"""
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            data = json.load(f)
+        self.interval_s = data.get('interval_s', self.interval_s)
+        self.reason = data.get('reason', self.reason)
+        self.next_poll_at = data.get('next_poll_at')
+        self.last_icaos = frozenset(data.get('last_icaos') or []) or None
+        self.last_nearest_km = data.get('last_nearest_km')
+        self.last_flights = data.get('last_flights') or []
+        with self.budget.lock:
+            self.budget._roll(self.clock())
+            if data.get('budget_day') == self.budget.day:
+                self.budget.spent = max(self.budget.spent, data.get('budget_spent', 0))
+
+# Budgets per account and schedulers per area, kept warm by a long-lived process
+_budgets = {}
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+def get_poll_scheduler(key, cost, username=None, schedule_config=None):
+    """
+    Return the scheduler for an area key. Areas polled with the same credentials
+    share one daily budget (config.schedule.daily_credits overrides OpenSky's
+    default for the auth mode). With config.schedule.path the schedule is
+    restored from that file on first use and should be saved after each poll.
+    """
+    schedule_config = schedule_config or {}
+    account = username or 'anonymous'
+    with _schedulers_lock:
+        budget = _budgets.get(account)
+        if budget is None:
+            default_credits = DAILY_CREDITS['authenticated' if username else 'anonymous']
+            budget = _budgets[account] = CreditBudget(schedule_config.get('daily_credits', default_credits), account)
+
+        scheduler = _schedulers.get(key)
+        if scheduler is None:
+            options = {name: schedule_config[name] for name in DEFAULT_SCHEDULE if name in schedule_config}
+            scheduler = _schedulers[key] = PollScheduler(key, cost, budget, options)
+            if schedule_config.get('path'):
+                scheduler.restore(schedule_config['path'])
+        else:
+            scheduler.cost = cost
+        return scheduler
+
+def find_poll_scheduler(key):
+    """The scheduler already created for key, or None"""
+    with _schedulers_lock:
+        return _schedulers.get(key)
+
+def synthetic_traffic(now, rng, peak_flights=40):
+    """Flights with distance_km following a day/night cycle (few at night, busiest mid-afternoon UTC-7)"""
+    local_hour = ((now / 3600.0) - 7) % 24
+    level = max(0.0, cos((local_hour - 15) / 24 * 2 * pi))
+    flights = []
+    for i in range(int(rng.gauss(peak_flights * level, 2) if level > 0.1 else 0)):
+        flights.append({'icao24': f"{0xa00000 + rng.randrange(4 * peak_flights):06x}",
+                        'distance_km': rng.uniform(0, 75)})
+    return flights
+
+def simulate(hours=24, radius_km=75.0, lat=39.8561, daily_credits=DAILY_CREDITS['anonymous'], seed=7):
+    """Run one scheduler against synthetic traffic on a simulated clock; returns a summary"""
+    clock = SimulatedClock(0.0)
+    lat_delta = radius_km / 111.0
+    lon_delta = radius_km / (111.0 * abs(cos(radians(lat))))
+    cost = credit_cost({'lamin': -lat_delta, 'lamax': lat_delta, 'lomin': -lon_delta, 'lomax': lon_delta})
+    budget = CreditBudget(daily_credits, 'simulation', clock)
+    scheduler = PollScheduler('simulation', cost, budget, clock=clock)
+    rng = random.Random(seed)
+
+    reasons, intervals = {}, []
+    end = hours * 3600.0
+    while clock() < end:
+        if scheduler.is_due():
+            decision = scheduler.record_poll(synthetic_traffic(clock(), rng))
+            key = 'budget' if decision['budget_limited'] else decision['reason']
+            reasons[key] = reasons.get(key, 0) + 1
+            intervals.append(decision['interval_s'])
+        clock.advance(max(1.0, (scheduler.next_poll_at or 0) - clock()))
+
+    return {
+        'hours': hours,
+        'credit_cost': cost,
+        'polls': len(intervals),
+        'credits_spent': len(intervals) * cost,
+        'daily_credits': daily_credits,
+        'decisions': reasons,
+        'min_interval_s': min(intervals) if intervals else None,
+        'max_interval_s': max(intervals) if intervals else None
+    }
+
+def main():
+    """Replay a day of synthetic traffic through the scheduler"""
+    parser = argparse.ArgumentParser(description="Simulate the adaptive poll scheduler")
+    parser.add_argument('command', choices=['simulate'])
+    parser.add_argument('--hours', type=float, default=24)
+    parser.add_argument('--radius-km', type=float, default=75.0)
+    parser.add_argument('--daily-credits', type=int, default=DAILY_CREDITS['anonymous'])
+    args = parser.parse_args()
+
+    summary = simulate(args.hours, args.radius_km, daily_credits=args.daily_credits)
+    log_info(f"✅ {summary['polls']} polls, {summary['credits_spent']}/{summary['daily_credits']} credits")
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main()
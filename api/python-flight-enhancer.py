@@ -4,12 +4,20 @@ Python service to enhance flight data with realistic routes and aircraft types
 Uses the official OpenSky Python API for retrieving real flight data
 """
 
+import argparse
+import io
 import json
 import sys
 import os
+import socketserver
+import stat
+import threading
+import time
 from datetime import datetime, timedelta
 from math import radians, cos
 
+import requests
+
 # Try to import the OpenSky API
 try:
     from opensky_api import OpenSkyApi
@@ -17,6 +25,107 @@ except ImportError:
     print("❌ Error: opensky-api not found. Please install it with: pip install opensky-api", file=sys.stderr)
     sys.exit(1)
 
+from bounded_executor import DEFAULT_MAX_IN_FLIGHT, iter_bounded, token_bucket_for
+from enrichment_cache import get_enrichment_cache
+from state_filter import filter_and_rank_states
+from geo import rank_by_distance
+from airport_index import load_airport_index
+from track_encoding import compact_track
+from snapshot_diff import get_snapshot_tracker
+from aircraft_registry import get_aircraft_registry
+from dead_reckoning import DEFAULT_MAX_AGE_S, DEFAULT_POLL_INTERVAL_S, extrapolate_flights, get_prediction_snapshot
+from poll_scheduler import credit_cost, find_poll_scheduler, get_poll_scheduler
+from tile_fetcher import get_tile_fetcher
+from state_recorder import RecordingLockedError, get_state_recorder
+from instrumentation import (METRICS, LOG_LEVELS, count, observe, span, profiled, set_log_level,
+                             log_error, log_warning, log_info, log_debug)
+
+# Track endpoints below this altitude (feet) are treated as at or near an airport
+LOW_ALTITUDE_FT = 2500
+TRACK_AIRPORT_RADIUS_KM = 8.0
+
+# icao24s per multi-aircraft states query (~14 bytes each keeps the URL well under 8 KB)
+CATEGORY_BATCH_SIZE = 150
+
+class PooledOpenSkyApi(OpenSkyApi):
+    """
+    OpenSky client that keeps one HTTP session (and its TLS connections) alive across
+    calls and paces every upstream request through a shared token bucket
+    """
+
+    def __init__(self, username=None, password=None):
+        super().__init__(username=username, password=password)
+        self._session = requests.Session()
+        self._rate_settings = None
+        self.limiter = None
+        self.configure({})
+
+    def configure(self, options):
+        """Apply per-request settings from config.opensky (api_url, requests_per_second, burst)"""
+        if options.get('api_url'):
+            self._api_url = options['api_url'].rstrip('/')
+        
+        rate_settings = (options.get('requests_per_second'), options.get('burst'))
+        if rate_settings != self._rate_settings:
+            self.limiter = token_bucket_for(len(self._auth) == 2, *rate_settings)
+            self._rate_settings = rate_settings
+
+    def _get_json(self, url_post, callee, params=None):
+        endpoint = url_post.strip('/').split('/')[0]
+        start = time.perf_counter()
+        self.limiter.acquire()
+        requested = time.perf_counter()
+        observe('rate_limit_wait_seconds', requested - start, endpoint=endpoint)
+        count('upstream_requests_total', endpoint=endpoint)
+        try:
+            response = self._session.get(
+                f"{self._api_url}{url_post}",
+                auth=self._auth,
+                params=params,
+                timeout=15.00
+            )
+        except Exception:
+            count('upstream_errors_total', endpoint=endpoint, status='exception')
+            raise
+        finally:
+            observe('upstream_request_seconds', time.perf_counter() - requested, endpoint=endpoint)
+        if response.status_code == 200:
+            self._last_requests[callee] = time.time()
+            return response.json()
+        count('upstream_errors_total', endpoint=endpoint, status=str(response.status_code))
+        message = f"⚠️ OpenSky request {url_post} failed with status {response.status_code}"
+        # Track lookups are per aircraft (and 404 routinely); upstream_errors_total still counts them
+        if endpoint == 'tracks':
+            log_debug(message)
+        else:
+            log_warning(message)
+        return None
+
+    def _check_rate_limit(self, time_diff_noauth, time_diff_auth, func):
+        # The stock client refuses a second get_states() within 5-10s of the last one on
+        # the same instance. A long-lived client would trip that constantly, so pacing is
+        # left to the caller (and to OpenSky's own 429 responses).
+        return True
+
+# One warm client per set of credentials, shared by every request this process handles
+_opensky_clients = {}
+_opensky_clients_lock = threading.Lock()
+
+def get_opensky_client(username=None, password=None, options=None):
+    """
+    Return the shared OpenSky client for the given credentials, creating it on first use.
+    options (the request's config.opensky block) updates its endpoint and pacing.
+    """
+    key = (username, password) if username and password else (None, None)
+    with _opensky_clients_lock:
+        api = _opensky_clients.get(key)
+        if api is None:
+            api = PooledOpenSkyApi(username=username, password=password) if key[0] else PooledOpenSkyApi()
+            _opensky_clients[key] = api
+        if options:
+            api.configure(options)
+        return api
+
 def get_aircraft_category_description(category_code):
     """Convert OpenSky aircraft category code to descriptive text"""
     category_map = {
@@ -56,111 +165,156 @@ def get_bounding_box(lat, lon, radius_km):
         'lomax': lon + lon_delta
     }
 
-def fetch_opensky_flights(lat, lon, radius_km, min_altitude_ft, max_altitude_ft, username=None, password=None):
-    """Fetch real flight data from OpenSky Network API"""
+def fetch_opensky_flights(lat, lon, radius_km, min_altitude_ft, max_altitude_ft, username=None, password=None,
+                          columnar=None, limit=None, tiles=None, recorder=None):
+    """
+    Fetch real flight data from OpenSky Network API.
+    Flights outside the true radius are dropped and the rest come back nearest
+    first with distance_km/bearing; limit keeps only the K nearest.
+    columnar=True selects the NumPy filtering path (see state_filter; default scalar).
+    With a TileFetcher the states come from its shared tile snapshots instead of a
+    states/all call of our own. With a StateRecorder every upstream poll is recorded.
+    """
     try:
-        print(f"🔍 Fetching flights: lat={lat}, lon={lon}, radius={radius_km}km", file=sys.stderr)
+        log_info(f"🔍 Fetching flights: lat={lat}, lon={lon}, radius={radius_km}km")
         
-        # Create OpenSky API client
-        api = OpenSkyApi(username=username, password=password) if username and password else OpenSkyApi()
+        # Reuse the warm OpenSky API client
+        api = get_opensky_client(username, password)
         
         # Calculate bounding box
         bbox = get_bounding_box(lat, lon, radius_km)
-        print(f"🔍 Bounding box: lamin={bbox['lamin']:.4f}, lamax={bbox['lamax']:.4f}, lomin={bbox['lomin']:.4f}, lomax={bbox['lomax']:.4f}", file=sys.stderr)
+        log_info(f"🔍 Bounding box: lamin={bbox['lamin']:.4f}, lamax={bbox['lamax']:.4f}, lomin={bbox['lomin']:.4f}, lomax={bbox['lomax']:.4f}")
         
         # Fetch states within bounding box
-        states = api.get_states(bbox=(bbox['lamin'], bbox['lamax'], bbox['lomin'], bbox['lomax']))
+        with span('bbox_fetch'):
+            if tiles:
+                states = tiles.states_for_bbox(bbox)
+            else:
+                snapshot = api.get_states(bbox=(bbox['lamin'], bbox['lamax'], bbox['lomin'], bbox['lomax']))
+                states = snapshot.states if snapshot else None
+                if snapshot and recorder:
+                    record_states(recorder, states or [])
         
-        if not states or not states.states:
-            print("⚠️ No flight states returned from OpenSky", file=sys.stderr)
+        if not states:
+            log_warning("⚠️ No flight states returned from OpenSky")
             return []
         
-        print(f"📊 OpenSky API returned {len(states.states)} total aircraft states", file=sys.stderr)
+        log_info(f"📊 OpenSky API returned {len(states)} total aircraft states")
         
-        flights = []
-        for state in states.states:
-            # Skip invalid or ground flights
-            if not state or state.on_ground or not state.latitude or not state.longitude:
-                continue
-            
-            # Convert altitude from meters to feet
-            altitude_ft = state.baro_altitude * 3.28084 if state.baro_altitude else 0
-            
-            # Check altitude filters
-            if not (min_altitude_ft <= altitude_ft <= max_altitude_ft):
-                continue
-            
-            # Convert velocity from m/s to knots
-            velocity_kts = state.velocity * 1.94384 if state.velocity else 0
-            
-            flight = {
-                'icao24': state.icao24,
-                'callsign': state.callsign.strip() if state.callsign else '',
-                'origin_country': state.origin_country,
-                'time_position': state.time_position,
-                'last_contact': state.last_contact,
-                'longitude': state.longitude,
-                'latitude': state.latitude,
-                'altitude': altitude_ft,
-                'on_ground': state.on_ground,
-                'velocity': velocity_kts,
-                'true_track': state.true_track,
-                'vertical_rate': state.vertical_rate * 196.85 if state.vertical_rate else 0,  # m/s to ft/min
-                'sensors': state.sensors,
-                'geo_altitude': state.geo_altitude * 3.28084 if state.geo_altitude else 0,
-                'squawk': state.squawk,
-                'spi': state.spi,
-                'position_source': state.position_source,
-                'category': state.category if hasattr(state, 'category') else 0
-            }
-            
-            flights.append(flight)
+        with span('filtering'):
+            # Drop ground/invalid states, apply the altitude window and convert units, then
+            # trim the rectangular bbox to the real circle and rank by distance from home
+            flights = filter_and_rank_states(states, min_altitude_ft, max_altitude_ft, lat, lon, radius_km, limit,
+                                             columnar)
         
-        print(f"✅ Filtered to {len(flights)} valid flights", file=sys.stderr)
+        log_info(f"✅ Filtered to {len(flights)} valid flights")
         return flights
         
     except Exception as e:
-        print(f"❌ Error fetching OpenSky data: {e}", file=sys.stderr)
+        log_error(f"❌ Error fetching OpenSky data: {e}")
         return []
 
-def enhance_flight_with_opensky_data(flight_icao, existing_callsign='', username=None, password=None):
-    """Get detailed information about a specific flight from OpenSky"""
+def record_states(recorder, states):
+    """Append one upstream poll to the recording; a recording failure never fails the fetch"""
     try:
-        print(f"🔍 Fetching detailed data for flight: {flight_icao}", file=sys.stderr)
-        
-        # Create OpenSky API client
-        api = OpenSkyApi(username=username, password=password) if username and password else OpenSkyApi()
-        
-        # Get track data (trajectory) - this is experimental but we'll try it
-        track_points = []
-        try:
-            track = api.get_track_by_aircraft(flight_icao.lower())
-            
-            if track and track.path:
-                track_points = [
-                    {
-                        'time': waypoint.time,
-                        'latitude': waypoint.latitude,
-                        'longitude': waypoint.longitude,
-                        'altitude': waypoint.baro_altitude * 3.28084 if waypoint.baro_altitude else None,
-                        'true_track': waypoint.true_track,
-                        'on_ground': waypoint.on_ground
-                    }
-                    for waypoint in track.path
-                    if waypoint.latitude and waypoint.longitude
-                ]
-                print(f"ℹ️ Track data found for {flight_icao}: {len(track_points)} points", file=sys.stderr)
-        except Exception as track_error:
-            print(f"⚠️ Track data not available for {flight_icao}: {track_error}", file=sys.stderr)
-        
-        # Get current state for category information
-        category = 0
+        recorder.append(states)
+    except Exception as e:
+        log_warning(f"⚠️ Could not record states: {e}")
+
+def fetch_aircraft_categories(flight_icaos, username=None, password=None):
+    """
+    Resolve OpenSky categories for many aircraft with multi-icao24 states queries
+    of CATEGORY_BATCH_SIZE aircraft each; a failed batch only loses its own aircraft
+    """
+    categories = {}
+    if not flight_icaos:
+        return categories
+    
+    api = get_opensky_client(username, password)
+    icaos = [icao.lower() for icao in flight_icaos]
+    for start in range(0, len(icaos), CATEGORY_BATCH_SIZE):
         try:
-            states = api.get_states(icao24=flight_icao.lower())
+            with span('state_fetch'):
+                states = api.get_states(icao24=icaos[start:start + CATEGORY_BATCH_SIZE])
             if states and states.states:
-                category = states.states[0].category if hasattr(states.states[0], 'category') else 0
+                for state in states.states:
+                    categories[state.icao24] = state.category if hasattr(state, 'category') else 0
         except Exception as state_error:
-            print(f"⚠️ State data not available for {flight_icao}: {state_error}", file=sys.stderr)
+            log_warning(f"⚠️ Batched state data not available: {state_error}")
+    log_info(f"ℹ️ Batched state lookup resolved {len(categories)}/{len(flight_icaos)} categories")
+    
+    return categories
+
+def categories_from_flights(flights):
+    """Build an icao24 -> category map from a fetch_opensky_flights snapshot"""
+    return {flight['icao24']: flight.get('category', 0) for flight in flights if flight.get('icao24')}
+
+def enhance_flight_with_opensky_data(flight_icao, existing_callsign='', username=None, password=None, category=None,
+                                     cache=None, track_options=None):
+    """
+    Get detailed information about a specific flight from OpenSky.
+    Pass category when it is already known (batched lookup or bbox snapshot)
+    to skip the per-aircraft states query; aircraft found in the local registry
+    skip it too and are typed from their ICAO type code. With an EnrichmentCache, fresh
+    cached tracks and categories are used instead of upstream calls.
+    track_options (config.track: tolerance_m, encoding) simplifies and re-encodes
+    the emitted track and adds track_stats.
+    """
+    try:
+        log_debug(f"🔍 Fetching detailed data for flight: {flight_icao}")
+        
+        # Reuse the warm OpenSky API client
+        api = get_opensky_client(username, password)
+        
+        # Get track data (trajectory) - this is experimental but we'll try it
+        track_points = cache.get(flight_icao, 'track') if cache else None
+        if track_points is not None:
+            log_debug(f"ℹ️ Track data for {flight_icao} served from cache: {len(track_points)} points")
+        else:
+            track_points = []
+            try:
+                with span('track_fetch'):
+                    track = api.get_track_by_aircraft(flight_icao.lower())
+                
+                if track and track.path:
+                    track_points = [
+                        {
+                            'time': waypoint.time,
+                            'latitude': waypoint.latitude,
+                            'longitude': waypoint.longitude,
+                            'altitude': waypoint.baro_altitude * 3.28084 if waypoint.baro_altitude else None,
+                            'true_track': waypoint.true_track,
+                            'on_ground': waypoint.on_ground
+                        }
+                        for waypoint in track.path
+                        if waypoint.latitude and waypoint.longitude
+                    ]
+                    log_debug(f"ℹ️ Track data found for {flight_icao}: {len(track_points)} points")
+                
+                # A None track means the request failed, so only real answers are cached
+                if cache and track is not None:
+                    cache.put(flight_icao, 'track', track_points)
+            except Exception as track_error:
+                log_debug(f"⚠️ Track data not available for {flight_icao}: {track_error}")
+        
+        # The registry gives the exact airframe type, which makes the category query unnecessary
+        registry = get_aircraft_registry()
+        type_code = registry.lookup(flight_icao)
+        
+        # Get current state for category information unless the caller, cache or registry already has it
+        if category is None and cache:
+            category = cache.get(flight_icao, 'category')
+        if category is None and type_code:
+            category = 0
+        if category is None:
+            category = 0
+            try:
+                with span('state_fetch'):
+                    states = api.get_states(icao24=flight_icao.lower())
+                if states and states.states:
+                    category = states.states[0].category if hasattr(states.states[0], 'category') else 0
+            except Exception as state_error:
+                log_debug(f"⚠️ State data not available for {flight_icao}: {state_error}")
         
         # Try to get flight information (this will only work for completed flights)
         departure_airport = None
@@ -168,30 +322,30 @@ def enhance_flight_with_opensky_data(flight_icao, existing_callsign='', username
         try:
             # For current flights, we can try to infer route based on track data
             if track_points and len(track_points) > 1:
-                # Get first and last points to infer route
-                first_point = track_points[0]
-                last_point = track_points[-1]
-                print(f"ℹ️ Track data available for route inference: {first_point} -> {last_point}", file=sys.stderr)
-                # We could implement airport lookup based on coordinates here
+                # Look up airports near the first and last points when they are on/near the ground
+                with span('route_inference'):
+                    departure_airport, arrival_airport = infer_airports_from_track(track_points)
+                if departure_airport:
+                    log_debug(f"ℹ️ Inferred departure for {flight_icao} from track: {departure_airport}")
         except Exception as flight_error:
-            print(f"⚠️ Flight data not available for {flight_icao}: {flight_error}", file=sys.stderr)
+            log_debug(f"⚠️ Flight data not available for {flight_icao}: {flight_error}")
         
-        # If we don't have category information from OpenSky, infer it from the callsign/airline
-        aircraft_type = get_aircraft_category_description(category)
+        # Registered airframes get their type name; otherwise describe the OpenSky category
+        aircraft_type = registry.type_name(type_code) if type_code else get_aircraft_category_description(category)
         if category == 0 and existing_callsign:
-            # Try to infer aircraft type from airline code
+            # Without a registry entry, try to infer aircraft type from airline code
             airline_code = existing_callsign[:2] if len(existing_callsign) >= 2 else ''
-            inferred_type = infer_aircraft_type_from_airline(airline_code)
+            inferred_type = None if type_code else infer_aircraft_type_from_airline(airline_code)
             if inferred_type:
                 aircraft_type = inferred_type
-                print(f"ℹ️ Inferred aircraft type for {flight_icao} ({airline_code}): {inferred_type}", file=sys.stderr)
+                log_debug(f"ℹ️ Inferred aircraft type for {flight_icao} ({airline_code}): {inferred_type}")
             
-            # Generate realistic route information
-            route_info = generate_realistic_route(airline_code, existing_callsign)
+            # Generate realistic route information unless the track already told us
+            route_info = None if departure_airport else generate_realistic_route(airline_code, existing_callsign)
             if route_info:
                 departure_airport = route_info['departure']
                 arrival_airport = route_info['arrival']
-                print(f"ℹ️ Generated route for {flight_icao} ({airline_code}): {route_info['route']}", file=sys.stderr)
+                log_debug(f"ℹ️ Generated route for {flight_icao} ({airline_code}): {route_info['route']}")
         
         enhanced_data = {
             'aircraft_type': aircraft_type,
@@ -199,20 +353,52 @@ def enhance_flight_with_opensky_data(flight_icao, existing_callsign='', username
             'category': category,
             'callsign': existing_callsign
         }
+        if type_code:
+            enhanced_data['type_code'] = type_code
         
         # Add route information if available
+        if departure_airport and not arrival_airport:
+            enhanced_data['departure'] = departure_airport
         if departure_airport and arrival_airport:
             enhanced_data['departure'] = departure_airport
             enhanced_data['arrival'] = arrival_airport
             enhanced_data['route'] = f"{departure_airport} → {arrival_airport}"
         
-        print(f"✅ Enhanced flight data for {flight_icao}: {len(track_points)} track points", file=sys.stderr)
+        # Simplify/encode the track last so route inference above saw every point
+        if track_options:
+            enhanced_data['track_points'], enhanced_data['track_stats'] = compact_track(
+                track_points,
+                track_options.get('tolerance_m'),
+                track_options.get('encoding', 'objects')
+            )
+        
+        log_debug(f"✅ Enhanced flight data for {flight_icao}: {len(track_points)} track points")
         return enhanced_data
         
     except Exception as e:
-        print(f"❌ Error enhancing flight {flight_icao}: {e}", file=sys.stderr)
+        count('flight_errors_total')
+        log_error(f"❌ Error enhancing flight {flight_icao}: {e}")
         return {}
 
+def infer_airports_from_track(track_points, max_distance_km=TRACK_AIRPORT_RADIUS_KM):
+    """
+    Infer (departure, arrival) IATA codes from a track's endpoints using the
+    nearest-airport index. An endpoint only counts when it is on the ground or
+    below LOW_ALTITUDE_FT; otherwise that side stays None.
+    """
+    index = load_airport_index()
+    
+    def airport_near(point):
+        altitude = point.get('altitude')
+        if not (point.get('on_ground') or altitude is None or altitude <= LOW_ALTITUDE_FT):
+            return None
+        match = index.nearest(point['latitude'], point['longitude'], max_distance_km)
+        return match[0] if match else None
+    
+    departure = airport_near(track_points[0])
+    arrival = airport_near(track_points[-1]) if len(track_points) > 1 else None
+    return departure, arrival
+
 def infer_aircraft_type_from_airline(airline_code):
     """Infer aircraft type based on airline code"""
     # Common airline to aircraft type mappings
@@ -261,68 +447,534 @@ def generate_realistic_route(airline_code, flight_number=''):
         'route': f"{departure} → {arrival}"
     }
 
-def enhance_flights_with_realistic_data(flight_icaos, existing_callsigns=None, username=None, password=None):
-    """Enhance multiple flights with real data from OpenSky API"""
+def enhance_flights_with_realistic_data(flight_icaos, existing_callsigns=None, username=None, password=None,
+                                       known_categories=None, max_in_flight=DEFAULT_MAX_IN_FLIGHT, timeout=None,
+                                       cache=None, track_options=None, on_flight=None):
+    """
+    Enhance multiple flights with real data from OpenSky API.
+    Categories come from known_categories (e.g. the bbox snapshot) or the cache where
+    possible; aircraft in the local registry need none, and the rest are resolved with
+    one batched states query instead of one per aircraft.
+    Track fetches then run concurrently (at most max_in_flight at once, paced by the
+    client's token bucket); a slow or failing aircraft yields {} without holding up
+    the rest of the batch. With on_flight, each (icao, data) is handed to the
+    callback as soon as it completes instead of being collected into the result.
+    """
     enhanced_flights = {}
     
+    # Skip invalid ICAO addresses
+    valid_icaos = []
     for icao in flight_icaos:
-        # Skip invalid ICAO addresses
         if not icao or len(icao) != 6:
-            print(f"⚠️ Skipping invalid ICAO: {icao}", file=sys.stderr)
+            log_warning(f"⚠️ Skipping invalid ICAO: {icao}")
             continue
-            
-        print(f"🔍 Enhancing flight data for ICAO: {icao}", file=sys.stderr)
+        valid_icaos.append(icao)
+    
+    categories = {icao.lower(): category for icao, category in (known_categories or {}).items()}
+    if cache:
+        cache.put_many(categories, 'category')
+        missing = [icao for icao in valid_icaos if icao.lower() not in categories]
+        categories.update(cache.get_many(missing, 'category'))
+    
+    missing = [icao for icao in valid_icaos if icao.lower() not in categories]
+    registered = get_aircraft_registry().lookup_many(missing)
+    missing = [icao for icao in missing if icao not in registered]
+    fetched = fetch_aircraft_categories(missing, username, password)
+    if cache:
+        cache.put_many(fetched, 'category')
+    categories.update(fetched)
+    
+    def enhance_one(icao):
+        log_debug(f"🔍 Enhancing flight data for ICAO: {icao}")
         
         # Get existing callsign if available
         existing_callsign = existing_callsigns.get(icao, '') if existing_callsigns else ''
         
-        # Get enhanced data from OpenSky
-        enhanced_data = enhance_flight_with_opensky_data(icao, existing_callsign, username, password)
-        
-        enhanced_flights[icao] = enhanced_data
+        # Get enhanced data from OpenSky; aircraft missing from the batched answer have no live state
+        category = categories.get(icao.lower(), None if icao in registered else 0)
+        with span('enhance_flight'):
+            return enhance_flight_with_opensky_data(icao, existing_callsign, username, password, category, cache,
+                                                    track_options)
+    
+    results = iter_bounded(enhance_one, valid_icaos, max_in_flight, default={}, timeout=timeout,
+                           ordered=on_flight is None)
+    for index, enhanced_data in results:
+        if on_flight:
+            on_flight(valid_icaos[index], enhanced_data)
+        else:
+            enhanced_flights[valid_icaos[index]] = enhanced_data
         
     return enhanced_flights
 
+def fetch_area_flights(query, username, password, tiles=None, recorder=None):
+    """fetch_opensky_flights for a bbox (or location) query document"""
+    return fetch_opensky_flights(
+        query['lat'],
+        query['lon'],
+        query.get('radius_km', 50),
+        query.get('min_altitude_ft', 0),
+        query.get('max_altitude_ft', 60000),
+        username,
+        password,
+        columnar=query.get('columnar'),
+        limit=query.get('limit'),
+        tiles=tiles,
+        recorder=recorder
+    )
+
+def area_state_recorder(input_data):
+    """The recorder for config.record.path, else None (also when it cannot be opened or is locked)"""
+    path = (input_data.get('config', {}).get('record') or {}).get('path')
+    if not path:
+        return None
+    try:
+        return get_state_recorder(path)
+    except RecordingLockedError as e:
+        log_info(f"ℹ️ State recording skipped: {e}")
+        return None
+    except Exception as e:
+        # Recording is best effort; the request is still served
+        log_warning(f"⚠️ State recording disabled, cannot open {path}: {e}")
+        return None
+
+def area_tile_fetcher(input_data, username, password, recorder=None):
+    """
+    The shared tile cache for requests with config.tiles (always for "locations"
+    requests), else None. One cache per account, so every display polled with
+    the same credentials shares tile snapshots and in-flight fetches.
+    """
+    tiles_config = input_data.get('config', {}).get('tiles')
+    if not tiles_config and 'locations' not in input_data:
+        return None
+    api = get_opensky_client(username, password)
+    
+    def fetch(bbox):
+        snapshot = api.get_states(bbox=bbox)
+        if snapshot is None:
+            raise RuntimeError(f"OpenSky states request failed for tile bbox {bbox}")
+        if recorder:
+            record_states(recorder, snapshot.states or [])
+        return snapshot.states or []
+    
+    return get_tile_fetcher(username or 'anonymous', fetch, tiles_config if isinstance(tiles_config, dict) else None)
+
+def area_snapshot_key(input_data):
+    """Key for per-area state (delta baseline, prediction snapshot, poll schedule)"""
+    query = input_data['bbox']
+    return input_data.get('snapshot_key') or f"{query['lat']},{query['lon']},{query.get('radius_km', 50)}"
+
+def area_poll_scheduler(input_data, username):
+    """The adaptive poll scheduler for a bbox request with "schedule": true, else None"""
+    if not input_data.get('schedule'):
+        return None
+    query = input_data['bbox']
+    bbox = get_bounding_box(query['lat'], query['lon'], query.get('radius_km', 50))
+    return get_poll_scheduler(area_snapshot_key(input_data), credit_cost(bbox), username,
+                              input_data.get('config', {}).get('schedule'))
+
+def record_area_poll(scheduler, flights, input_data, now=None):
+    """Let the scheduler see a poll's result and persist it for one-shot runs"""
+    decision = scheduler.record_poll(flights, now)
+    schedule_path = input_data.get('config', {}).get('schedule', {}).get('path')
+    if schedule_path:
+        scheduler.save(schedule_path)
+    log_info(f"⏱️ Next poll in {decision['next_poll_in_s']}s ({decision['reason']}"
+             f"{', budget-limited' if decision['budget_limited'] else ''}), "
+             f"{decision['credits_remaining']} credits left today")
+
+def predict_area_flights(query, snapshot_key, predict_config, username, password, scheduler=None, input_data=None,
+                         tiles=None, recorder=None):
+    """
+    Serve the area from the last upstream snapshot, dead-reckoned to now, and only
+    poll OpenSky when the snapshot is older than config.predict.poll_interval_s
+    (or, with a scheduler, when the scheduler says a poll is due)
+    """
+    now = time.time()
+    snapshot = get_prediction_snapshot(snapshot_key, predict_config)
+    with snapshot.lock:
+        if scheduler:
+            due = snapshot.fetched_at is None or scheduler.is_due(now)
+        else:
+            due = snapshot.is_stale(now, predict_config.get('poll_interval_s', DEFAULT_POLL_INTERVAL_S))
+        if due:
+            # Keep the whole circle: the nearest `limit` can change as aircraft move, so limit after extrapolating
+            snapshot.update(fetch_area_flights(dict(query, limit=None), username, password, tiles, recorder), now)
+            if predict_config.get('path'):
+                snapshot.save(predict_config['path'])
+            if scheduler:
+                record_area_poll(scheduler, snapshot.flights, input_data, now)
+            log_info(f"🔄 Prediction snapshot refreshed: {len(snapshot.flights)} flights")
+        flights = snapshot.flights
+    
+    with span('prediction'):
+        predicted = extrapolate_flights(flights, now, predict_config.get('max_age_s', DEFAULT_MAX_AGE_S))
+        # Moved aircraft get fresh distance/bearing and may have left the circle
+        return rank_by_distance(predicted, query['lat'], query['lon'], query.get('radius_km', 50), query.get('limit'))
+
+def handle_area_query(input_data, username, password, enhance_options, on_flight=None):
+    """
+    Fetch the flights around a home point, optionally diff them against the
+    previous poll ("delta": true) and enhance them ("enhance": true). With a
+    delta, only newly seen aircraft are enhanced. With "predict": true,
+    positions are extrapolated from the last snapshot between upstream polls.
+    With "schedule": true, the adaptive scheduler records each upstream poll and
+    decides when the next one is due; until then the last poll is served. With config.tiles, states come from the
+    shared tile cache. With config.record.path, every upstream poll is recorded.
+    """
+    query = input_data['bbox']
+    snapshot_key = area_snapshot_key(input_data)
+    scheduler = area_poll_scheduler(input_data, username)
+    recorder = area_state_recorder(input_data)
+    tiles = area_tile_fetcher(input_data, username, password, recorder)
+    if input_data.get('predict'):
+        predict_config = input_data.get('config', {}).get('predict', {})
+        flights = predict_area_flights(query, snapshot_key, predict_config, username, password, scheduler,
+                                       input_data, tiles, recorder)
+    elif scheduler and not scheduler.is_due():
+        # Not due (or out of credits): serve the last poll instead of spending another
+        flights = scheduler.last_flights
+        count('poll_skips_total')
+        log_info(f"⏱️ Poll not due for {scheduler.state()['next_poll_in_s']}s, "
+                 f"serving the last {len(flights)} flights")
+    else:
+        flights = fetch_area_flights(query, username, password, tiles, recorder)
+        if scheduler:
+            record_area_poll(scheduler, flights, input_data)
+    
+    delta = None
+    if input_data.get('delta'):
+        delta_config = input_data.get('config', {}).get('delta', {})
+        tracker = get_snapshot_tracker(snapshot_key, delta_config)
+        delta = tracker.diff(flights)
+        if delta_config.get('path'):
+            tracker.save(delta_config['path'])
+        log_info(f"ℹ️ Snapshot delta: {len(delta['added'])} added, {len(delta['updated'])} updated, "
+                 f"{len(delta['removed'])} removed")
+    new_flights = delta['added'] if delta else flights
+    
+    enhanced = None
+    if input_data.get('enhance'):
+        snapshot = {flight['icao24']: flight for flight in new_flights}
+        emit = (lambda icao, data: on_flight({'type': 'added' if delta else 'flight', 'icao24': icao,
+                                              'flight': snapshot.get(icao), 'data': data})) \
+            if on_flight else None
+        
+        # Enhance straight from the snapshot: callsigns and categories are already known
+        enhanced = enhance_flights_with_realistic_data(
+            [flight['icao24'] for flight in new_flights],
+            {flight['icao24']: flight['callsign'] for flight in new_flights},
+            username,
+            password,
+            known_categories=categories_from_flights(new_flights),
+            on_flight=emit,
+            **enhance_options
+        )
+    elif on_flight:
+        for flight in new_flights:
+            on_flight({'type': 'added' if delta else 'flight', 'icao24': flight['icao24'], 'flight': flight})
+    
+    if on_flight:
+        for update in (delta['updated'] if delta else []):
+            on_flight({'type': 'updated', **update})
+        for icao in (delta['removed'] if delta else []):
+            on_flight({'type': 'removed', 'icao24': icao})
+        return []
+    
+    if enhanced is None:
+        return delta if delta else flights
+    return {'delta': delta, 'enhanced': enhanced} if delta else {'flights': flights, 'enhanced': enhanced}
+
+def handle_locations_query(input_data, username, password, on_flight=None):
+    """
+    Serve many home locations from one set of tile fetches. Every tile the
+    locations touch is fetched up front (merged into as few bbox queries as
+    possible), then each location is filtered to its own radius, altitude
+    window and limit. Returns {location id: flights}.
+    """
+    locations = input_data['locations']
+    tiles = area_tile_fetcher(input_data, username, password, area_state_recorder(input_data))
+    
+    wanted = set()
+    for location in locations:
+        wanted |= tiles.grid.tiles_for_bbox(get_bounding_box(location['lat'], location['lon'],
+                                                             location.get('radius_km', 50)))
+    log_info(f"🧩 {len(locations)} locations cover {len(wanted)} tiles")
+    try:
+        with span('bbox_fetch'):
+            tiles.states_for_tiles(wanted)
+    except Exception as e:
+        # Don't let every location retry a failing upstream on its own
+        log_error(f"❌ Error fetching OpenSky tiles: {e}")
+        return {} if on_flight else {str(location.get('id', index)): [] for index, location in enumerate(locations)}
+    
+    results = {}
+    for index, location in enumerate(locations):
+        location_id = str(location.get('id', index))
+        flights = fetch_area_flights(location, username, password, tiles)
+        if on_flight:
+            for flight in flights:
+                on_flight({'location': location_id, 'icao24': flight['icao24'], 'flight': flight})
+        else:
+            results[location_id] = flights
+    return results
+
+def handle_request(input_data, on_flight=None):
+    """
+    Process one request document and return the JSON-serializable result.
+    With on_flight, per-flight records ({'icao24', 'data'} and/or 'flight') are
+    passed to the callback as they become available instead of being returned.
+    """
+    # Extract configuration
+    config = input_data.get('config', {})
+    opensky_config = config.get('opensky', {})
+    username = opensky_config.get('username')
+    password = opensky_config.get('password')
+    
+    log_info(f"🔐 OpenSky Auth: {'ENABLED' if username and password else 'DISABLED'}")
+    
+    # Apply endpoint/pacing settings to the shared client before any upstream call
+    get_opensky_client(username, password, opensky_config)
+    enhance_options = {
+        'max_in_flight': opensky_config.get('max_in_flight', DEFAULT_MAX_IN_FLIGHT),
+        'timeout': opensky_config.get('batch_timeout'),
+        'cache': get_enrichment_cache(config.get('cache')),
+        'track_options': config.get('track')
+    }
+    
+    # Area query: return the filtered state vectors around a home point
+    if 'bbox' in input_data:
+        return handle_area_query(input_data, username, password, enhance_options, on_flight)
+    
+    # Many home locations (displays) served from shared tile snapshots
+    if 'locations' in input_data:
+        return handle_locations_query(input_data, username, password, on_flight)
+    
+    # Get ICAO addresses to process
+    if 'icao24' in input_data:
+        icaos = [input_data['icao24']]
+    elif 'icao24s' in input_data:
+        icaos = input_data['icao24s']
+    else:
+        raise ValueError("Input must contain 'icao24', 'icao24s', 'bbox' or 'locations'")
+    
+    # Get existing callsigns and categories (e.g. from an earlier bbox snapshot) if provided
+    existing_callsigns = input_data.get('existing_callsigns', {})
+    known_categories = input_data.get('categories')
+    log_info(f"🔍 Processing {len(icaos)} flights")
+    
+    # Enhance flight data with OpenSky API
+    return enhance_flights_with_realistic_data(icaos, existing_callsigns, username, password, known_categories,
+                                               on_flight=(lambda icao, data: on_flight({'icao24': icao, 'data': data}))
+                                               if on_flight else None,
+                                               **enhance_options)
+
+def cache_stats_for(input_data):
+    """Cache counters to report alongside a request's result, or None when caching is off"""
+    cache = get_enrichment_cache(input_data.get('config', {}).get('cache'))
+    return cache.stats() if cache else None
+
+def schedule_state_for(input_data):
+    """The poll scheduler's latest decision for a scheduled bbox request, or None"""
+    if 'bbox' not in input_data or not input_data.get('schedule'):
+        return None
+    scheduler = find_poll_scheduler(area_snapshot_key(input_data))
+    return scheduler.state() if scheduler else None
+
+def metrics_trailer(input_data):
+    """Process-wide metrics to attach to a response when config.metrics.trailer is set, else None"""
+    metrics_config = input_data.get('config', {}).get('metrics') or {}
+    return METRICS.to_dict() if metrics_config.get('trailer') else None
+
+def with_trailer(result, key, value):
+    """Attach a one-shot trailer (_cache/_schedule/_metrics); a bare flight list becomes {'flights': [...]} to carry it"""
+    if isinstance(result, list):
+        result = {'flights': result}
+    result[key] = value
+    return result
+
+def write_metrics_file(input_data):
+    """Rewrite the Prometheus textfile named by config.metrics.prometheus_path, if any"""
+    path = (input_data.get('config', {}).get('metrics') or {}).get('prometheus_path')
+    if path:
+        METRICS.write_prometheus(path)
+
+def stream_request(input_data, outfile, request_id=None):
+    """
+    Streaming mode: write one compact JSON line per flight as soon as it is ready,
+    then a summary trailer line. Lines carry the request id when there is one.
+    """
+    start = time.time()
+    flights_written = 0
+    lock = threading.Lock()
+    
+    def write_line(record):
+        if request_id is not None:
+            record = {'id': request_id, **record}
+        with span('serialization'):
+            line = json.dumps(record, separators=(',', ':'))
+        with lock:
+            outfile.write(line + '\n')
+            outfile.flush()
+    
+    def on_flight(record):
+        nonlocal flights_written
+        flights_written += 1
+        # Delta records carry their own type (added/updated/removed)
+        write_line({'type': 'flight', **record})
+    
+    handle_request(input_data, on_flight)
+    
+    summary = {'type': 'summary', 'flights': flights_written, 'elapsed_s': round(time.time() - start, 3)}
+    cache_stats = cache_stats_for(input_data)
+    if cache_stats:
+        summary['cache'] = cache_stats
+    schedule = schedule_state_for(input_data)
+    if schedule:
+        summary['schedule'] = schedule
+    metrics = metrics_trailer(input_data)
+    if metrics:
+        summary['metrics'] = metrics
+    write_line(summary)
+    write_metrics_file(input_data)
+
+def serve_stream(infile, outfile):
+    """
+    Daemon loop: read newline-delimited JSON requests and write one tagged
+    response line per request, keeping the process and OpenSky client warm
+    """
+    for line in infile:
+        line = line.strip()
+        if not line:
+            continue
+        
+        request_id = None
+        input_data = {}
+        try:
+            input_data = json.loads(line)
+            request_id = input_data.get('id')
+            if input_data.get('stream'):
+                stream_request(input_data, outfile, request_id)
+                continue
+            response = {'id': request_id, 'result': handle_request(input_data)}
+            cache_stats = cache_stats_for(input_data)
+            if cache_stats:
+                response['cache'] = cache_stats
+            schedule = schedule_state_for(input_data)
+            if schedule:
+                response['schedule'] = schedule
+            metrics = metrics_trailer(input_data)
+            if metrics:
+                response['metrics'] = metrics
+        except Exception as e:
+            log_error(f"❌ Error handling request {request_id}: {e}")
+            response = {'id': request_id, 'error': str(e)}
+        
+        with span('serialization'):
+            line = json.dumps(response)
+        outfile.write(line + '\n')
+        outfile.flush()
+        write_metrics_file(input_data)
+
+class EnhancerRequestHandler(socketserver.StreamRequestHandler):
+    """Serve newline-delimited JSON requests for one Unix socket connection"""
+
+    def handle(self):
+        infile = io.TextIOWrapper(self.rfile, encoding='utf-8')
+        outfile = io.TextIOWrapper(self.wfile, encoding='utf-8', write_through=True)
+        serve_stream(infile, outfile)
+
+def serve_unix_socket(socket_path):
+    """Listen on a Unix socket; every connection speaks the same NDJSON protocol as stdin"""
+    if os.path.exists(socket_path):
+        # Only clear a stale socket left by a previous daemon, never a file given by mistake
+        if not stat.S_ISSOCK(os.stat(socket_path).st_mode):
+            raise FileExistsError(f"{socket_path} exists and is not a Unix socket")
+        os.unlink(socket_path)
+    
+    with socketserver.ThreadingUnixStreamServer(socket_path, EnhancerRequestHandler) as server:
+        server.daemon_threads = True
+        log_info(f"🔧 Python enhancement daemon listening on {socket_path}")
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(socket_path)
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Enhance flight data using the OpenSky API")
+    parser.add_argument('--daemon', action='store_true',
+                        help="stay running and answer newline-delimited JSON requests from stdin")
+    parser.add_argument('--socket', metavar='PATH',
+                        help="with --daemon, listen on this Unix socket instead of stdin")
+    parser.add_argument('--stream', action='store_true',
+                        help="write one NDJSON line per flight as it is enhanced, then a summary line")
+    parser.add_argument('--log-level', choices=list(LOG_LEVELS),
+                        help="stderr verbosity; per-flight lines only appear at debug (default: AIRVIEW_LOG_LEVEL or debug)")
+    parser.add_argument('--profile', metavar='PATH',
+                        help="run under cProfile and write the stats to PATH (default: AIRVIEW_PROFILE)")
+    return parser.parse_args(argv)
+
 def main():
     """Main function - fetch and enhance flight data using OpenSky API"""
+    args = parse_args()
+    if args.log_level:
+        set_log_level(args.log_level)
+    
+    with profiled(args.profile):
+        run(args)
+
+def run(args):
+    """Serve as a daemon or handle one request from stdin"""
+    if args.daemon:
+        log_info("🔧 Python enhancement daemon started with OpenSky API")
+        if args.socket:
+            serve_unix_socket(args.socket)
+        else:
+            serve_stream(sys.stdin, sys.stdout)
+        return
+    
+    streaming = args.stream
     try:
-        print("🔧 Python enhancement service started with OpenSky API", file=sys.stderr)
+        log_info("🔧 Python enhancement service started with OpenSky API")
         
         # Read JSON input from stdin
         input_data = json.loads(sys.stdin.read())
-        print(f"🔍 Input data received", file=sys.stderr)
+        log_info(f"🔍 Input data received")
         
-        # Extract configuration
-        config = input_data.get('config', {})
-        opensky_config = config.get('opensky', {})
-        username = opensky_config.get('username')
-        password = opensky_config.get('password')
+        streaming = streaming or bool(input_data.get('stream'))
+        if streaming:
+            stream_request(input_data, sys.stdout)
+            log_info("✅ Python enhancement completed successfully")
+            return
         
-        print(f"🔐 OpenSky Auth: {'ENABLED' if username and password else 'DISABLED'}", file=sys.stderr)
+        enhanced_data = handle_request(input_data)
         
-        # Get ICAO addresses to process
-        if 'icao24' in input_data:
-            icaos = [input_data['icao24']]
-        elif 'icao24s' in input_data:
-            icaos = input_data['icao24s']
-        else:
-            raise ValueError("Input must contain 'icao24' or 'icao24s'")
+        # Report cache counters and metrics next to the per-aircraft entries (keys are never 6-hex icao24s)
+        cache_stats = cache_stats_for(input_data)
+        if cache_stats:
+            enhanced_data = with_trailer(enhanced_data, '_cache', cache_stats)
+        schedule = schedule_state_for(input_data)
+        if schedule:
+            enhanced_data = with_trailer(enhanced_data, '_schedule', schedule)
+        metrics = metrics_trailer(input_data)
+        if metrics:
+            enhanced_data = with_trailer(enhanced_data, '_metrics', metrics)
         
-        # Get existing callsigns if provided
-        existing_callsigns = input_data.get('existing_callsigns', {})
-        print(f"🔍 Processing {len(icaos)} flights", file=sys.stderr)
-        
-        # Enhance flight data with OpenSky API
-        enhanced_data = enhance_flights_with_realistic_data(icaos, existing_callsigns, username, password)
-        
-        # Output JSON result
-        print(json.dumps(enhanced_data, indent=2))
-        print("✅ Python enhancement completed successfully", file=sys.stderr)
+        # Output JSON result (compact when config.output.compact is set)
+        compact = input_data.get('config', {}).get('output', {}).get('compact')
+        with span('serialization'):
+            output = json.dumps(enhanced_data, separators=(',', ':')) if compact else json.dumps(enhanced_data, indent=2)
+        print(output)
+        write_metrics_file(input_data)
+        log_info("✅ Python enhancement completed successfully")
         
     except Exception as e:
-        print(f"❌ Error: {e}", file=sys.stderr)
-        error_result = {'error': str(e)}
-        print(json.dumps(error_result, indent=2))
+        log_error(f"❌ Error: {e}")
+        if streaming:
+            print(json.dumps({'type': 'error', 'error': str(e)}, separators=(',', ':')))
+        else:
+            error_result = {'error': str(e)}
+            print(json.dumps(error_result, indent=2))
         sys.exit(1)
 
 if __name__ == "__main__":
@@ -4,6 +4,7 @@ Enhanced flight data service with departure/arrival information
 This service can integrate with multiple APIs to provide comprehensive flight information
 """
 
+import argparse
 import json
 import sys
 import requests
@@ -17,6 +18,8 @@ except ImportError:
     OPENSKY_AVAILABLE = False
     print("⚠️ OpenSky API not available", file=sys.stderr)
 
+from route_store import IATA_CALLSIGN_PATTERN, get_route_store
+
 # Sample airline to airport route database (in a real implementation, you'd use a comprehensive database)
 AIRLINE_ROUTE_DB = {
     # Major airline hubs - this is a simplified example
@@ -33,7 +36,7 @@ AIRLINE_ROUTE_DB = {
         'DEN': ['ATL', 'MSP', 'SLC', 'SEA', 'JFK'],
         'ATL': ['DEN', 'LAX', 'JFK', 'MIA', 'ORD']
     },
-    'SW': {  # Southwest
+    'WN': {  # Southwest
         'DEN': ['LAS', 'PHX', 'OAK', 'SAN', 'LAX']
     }
 }
@@ -59,18 +62,46 @@ AIRPORT_CITY_MAP = {
     'SAN': 'San Diego, CA'
 }
 
-def get_route_info(callsign):
+def build_route_info(origin, destination):
+    """Route dict with city names for a departure/arrival pair"""
+    return {
+        'departure': origin,
+        'arrival': destination,
+        'departure_city': AIRPORT_CITY_MAP.get(origin, origin),
+        'arrival_city': AIRPORT_CITY_MAP.get(destination, destination),
+        'route': f"{origin} → {destination}"
+    }
+
+def get_route_info(callsign, memo=None):
     """
     Infer route information based on callsign
-    In a real implementation, this would query an actual flight schedule database
+    The route database (api/routes.db) is checked first by full flight number,
+    resolving ICAO (UAL1234) and IATA (UA1234) callsigns alike; otherwise fall back
+    to the airline-level sample table. Pass a dict as memo to reuse answers for
+    repeated callsigns within a batch.
     """
     if not callsign or len(callsign) < 3:
         return None
     
-    airline_code = callsign[:2]
-    # For demo purposes, we'll extract origin from the callsign if it follows a pattern
-    # Many airlines include origin airport in flight number (e.g., DAL1234 where DAL is both airline and origin)
-    # But this varies by airline - real implementation would use flight schedule database
+    if memo is not None:
+        if callsign not in memo:
+            memo[callsign] = get_route_info(callsign)
+        return memo[callsign]
+    
+    store = get_route_store()
+    route = store.lookup(callsign)
+    if route:
+        return build_route_info(*route)
+    
+    return airline_route_info(callsign, store)
+
+def airline_route_info(callsign, store):
+    """Airline-level guess from the sample table for callsigns missing from the route database"""
+    # Resolve the airline designator properly; the two-letter slice is only a last
+    # resort for unresolved IATA-shaped callsigns, so DLH400 never becomes DL
+    airline_code = store.resolver.airline_code(callsign)
+    if airline_code is None and IATA_CALLSIGN_PATTERN.match(callsign.strip().upper()):
+        airline_code = callsign.strip().upper()[:2]
     
     if airline_code in AIRLINE_ROUTE_DB:
         # For this example, let's assume DEN as origin (since that's your location)
@@ -80,67 +111,238 @@ def get_route_info(callsign):
             if destinations:
                 # Just pick the first destination for demo
                 destination = destinations[0]
-                return {
-                    'departure': origin,
-                    'arrival': destination,
-                    'departure_city': AIRPORT_CITY_MAP.get(origin, origin),
-                    'arrival_city': AIRPORT_CITY_MAP.get(destination, destination),
-                    'route': f"{origin} → {destination}"
-                }
+                return build_route_info(origin, destination)
     
     return None
 
+ENHANCED_FIELDS = ['departure_airport', 'arrival_airport', 'departure_city', 'arrival_city', 'route']
+
+# Fallback values for flights without route information
+UNKNOWN_ROUTE_VALUES = ('Unknown', 'Unknown', 'Unknown City', 'Unknown City', 'Unknown Route')
+
+# Batches at least this large go through enhance_with_route_data_bulk
+BULK_THRESHOLD = 10000
+
 def enhance_with_route_data(flights):
     """
     Add departure and arrival information to flights
     """
-    enhanced_flights = []
+    memo = {}
+    return [enhance_flight_with_route_data(flight, memo) for flight in flights]
+
+def enhance_with_route_data_bulk(flights, columnar=False):
+    """
+    Bulk path for large batches: group flights by callsign and resolve each
+    unique callsign once.
+    By default the five route fields are attached to the input dicts in place
+    (no per-flight copy) and the same list is returned. With columnar=True the
+    inputs are left untouched and the route fields come back as a separate
+    {field: [values...]} block aligned with the input indexes.
+    """
+    indexes_by_callsign = {}
+    for index, flight in enumerate(flights):
+        indexes_by_callsign.setdefault(flight.get('callsign', ''), []).append(index)
     
-    for flight in flights:
-        enhanced_flight = flight.copy()
-        
-        # Try to get route information
-        route_info = None
-        callsign = flight.get('callsign', '')
-        
-        if callsign:
-            route_info = get_route_info(callsign)
-        
-        if route_info:
-            enhanced_flight['departure_airport'] = route_info['departure']
-            enhanced_flight['arrival_airport'] = route_info['arrival']
-            enhanced_flight['departure_city'] = route_info['departure_city']
-            enhanced_flight['arrival_city'] = route_info['arrival_city']
-            enhanced_flight['route'] = route_info['route']
-        else:
-            # Fallback to generic route information
-            enhanced_flight['departure_airport'] = 'Unknown'
-            enhanced_flight['arrival_airport'] = 'Unknown'
-            enhanced_flight['departure_city'] = 'Unknown City'
-            enhanced_flight['arrival_city'] = 'Unknown City'
-            enhanced_flight['route'] = 'Unknown Route'
-        
-        enhanced_flights.append(enhanced_flight)
+    # One batched database pass for all unique callsigns, then the airline table for the misses
+    store = get_route_store()
+    candidates = [callsign for callsign in indexes_by_callsign if callsign and len(callsign) >= 3]
+    routes = store.lookup_many(candidates)
     
-    return enhanced_flights
+    values_by_callsign = dict.fromkeys(indexes_by_callsign, UNKNOWN_ROUTE_VALUES)
+    for callsign in candidates:
+        route = routes.get(callsign)
+        route_info = build_route_info(*route) if route else airline_route_info(callsign, store)
+        values_by_callsign[callsign] = (
+            route_info['departure'],
+            route_info['arrival'],
+            route_info['departure_city'],
+            route_info['arrival_city'],
+            route_info['route']
+        ) if route_info else UNKNOWN_ROUTE_VALUES
+    
+    if columnar:
+        columns = [[None] * len(flights) for _ in ENHANCED_FIELDS]
+        for callsign, indexes in indexes_by_callsign.items():
+            for column, value in zip(columns, values_by_callsign[callsign]):
+                for index in indexes:
+                    column[index] = value
+        return dict(zip(ENHANCED_FIELDS, columns))
+    
+    for callsign, indexes in indexes_by_callsign.items():
+        fields = dict(zip(ENHANCED_FIELDS, values_by_callsign[callsign]))
+        for index in indexes:
+            flights[index].update(fields)
+    return flights
+
+def enhance_flight_with_route_data(flight, memo=None):
+    """
+    Add departure and arrival information to a single flight
+    """
+    enhanced_flight = flight.copy()
+    
+    # Try to get route information
+    route_info = None
+    callsign = flight.get('callsign', '')
+    
+    if callsign:
+        route_info = get_route_info(callsign, memo)
+    
+    if route_info:
+        enhanced_flight['departure_airport'] = route_info['departure']
+        enhanced_flight['arrival_airport'] = route_info['arrival']
+        enhanced_flight['departure_city'] = route_info['departure_city']
+        enhanced_flight['arrival_city'] = route_info['arrival_city']
+        enhanced_flight['route'] = route_info['route']
+    else:
+        # Fallback to generic route information
+        enhanced_flight['departure_airport'] = 'Unknown'
+        enhanced_flight['arrival_airport'] = 'Unknown'
+        enhanced_flight['departure_city'] = 'Unknown City'
+        enhanced_flight['arrival_city'] = 'Unknown City'
+        enhanced_flight['route'] = 'Unknown Route'
+    
+    return enhanced_flight
+
+class IncrementalJSONReader:
+    """
+    Pull-parser over a text stream for documents shaped like {"flights": [...], ...}.
+    Only one array element is decoded at a time, so memory stays flat no matter
+    how many flights the input holds.
+    """
+
+    def __init__(self, stream, chunk_size=65536):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop what has already been consumed before appending
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character without consuming it ('' at end of input)"""
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in ' \t\r\n':
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' in input but found '{found or 'end of input'}'")
+        self.position += 1
+
+    def value(self):
+        """Decode the next complete JSON value, reading more input as needed"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                # A number at the very end of the buffer might continue in the next chunk
+                if end < len(self.buffer) or self.eof or not isinstance(value, (int, float)):
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def iter_array(self, key):
+        """Yield each element of the top-level array under key; other keys are decoded and skipped"""
+        self.expect('{')
+        if self.peek() == '}':
+            return
+        while True:
+            name = self.value()
+            self.expect(':')
+            if name == key:
+                self.expect('[')
+                if self.peek() != ']':
+                    while True:
+                        yield self.value()
+                        if self.peek() != ',':
+                            break
+                        self.position += 1
+                self.expect(']')
+            else:
+                self.value()
+            if self.peek() != ',':
+                break
+            self.position += 1
+        self.expect('}')
+
+def stream_route_data(infile, outfile):
+    """
+    Streaming mode: parse flights incrementally and write one compact JSON line
+    per enhanced flight, followed by a summary trailer line
+    """
+    count = 0
+    memo = {}
+    for flight in IncrementalJSONReader(infile).iter_array('flights'):
+        record = {'type': 'flight', 'flight': enhance_flight_with_route_data(flight, memo)}
+        outfile.write(json.dumps(record, separators=(',', ':')) + '\n')
+        outfile.flush()
+        count += 1
+    
+    summary = {'type': 'summary', 'flights': count, 'enhanced_fields': ENHANCED_FIELDS}
+    outfile.write(json.dumps(summary, separators=(',', ':')) + '\n')
+    outfile.flush()
 
 def main():
     """
     Enhanced flight data processor that adds departure/arrival information
     """
+    parser = argparse.ArgumentParser(description="Add departure/arrival information to flights")
+    parser.add_argument('--stream', action='store_true',
+                        help="parse input incrementally and write one NDJSON line per flight plus a summary line")
+    args = parser.parse_args()
+    
+    if args.stream:
+        try:
+            stream_route_data(sys.stdin, sys.stdout)
+        except Exception as e:
+            print(json.dumps({'type': 'error', 'error': str(e)}, separators=(',', ':')))
+            sys.exit(1)
+        return
+    
     try:
         # Read input data
         input_data = json.loads(sys.stdin.read())
         
         # Process flights to add route information
         flights = input_data.get('flights', [])
-        enhanced_flights = enhance_with_route_data(flights)
         
-        # Output enhanced data
-        output = {
-            'flights': enhanced_flights,
-            'enhanced_fields': ['departure_airport', 'arrival_airport', 'departure_city', 'arrival_city', 'route']
-        }
+        if input_data.get('columnar'):
+            # Route fields as an index-aligned block next to the untouched flights
+            output = {
+                'flights': flights,
+                'route_columns': enhance_with_route_data_bulk(flights, columnar=True),
+                'enhanced_fields': ENHANCED_FIELDS
+            }
+        else:
+            if input_data.get('bulk') or len(flights) >= BULK_THRESHOLD:
+                # The parsed input is ours, so fields can be attached without copying
+                enhanced_flights = enhance_with_route_data_bulk(flights)
+            else:
+                enhanced_flights = enhance_with_route_data(flights)
+            
+            # Output enhanced data
+            output = {
+                'flights': enhanced_flights,
+                'enhanced_fields': ENHANCED_FIELDS
+            }
         
         print(json.dumps(output, indent=2))
         
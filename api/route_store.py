@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+File-backed route database for route-enhancer.py
+Routes live in a SQLite table keyed by normalized flight number (IATA airline
+designator + number, e.g. "UA1234"), so lookups are B-tree O(log n) even with
+hundreds of thousands of routes. ICAO callsigns ("UAL1234") are resolved to the
+IATA designator using api/airline-codes.json. The database is opened lazily on
+the first lookup.
+
+Build it from a CSV with flight_number,departure,arrival columns:
+    python3 api/route_store.py build routes.csv [--db api/routes.db]
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+AIRLINE_CODES_PATH = os.path.join(API_DIR, 'airline-codes.json')
+DEFAULT_ROUTE_DB_PATH = os.environ.get('AIRVIEW_ROUTES_DB', os.path.join(API_DIR, 'routes.db'))
+
+CALLSIGN_PATTERN = re.compile(r'^([A-Z]{3}|[A-Z0-9]{2})0*(\d{1,4}[A-Z]?)$')
+IATA_CALLSIGN_PATTERN = re.compile(r'^[A-Z0-9]{2}\d')
+
+class AirlineCodeResolver:
+    """Maps ICAO (3-letter) airline designators to IATA (2-character) ones via airline-codes.json"""
+
+    def __init__(self, airline_codes):
+        iata_by_name = {}
+        for code, name in airline_codes.items():
+            if len(code) == 2:
+                iata_by_name.setdefault(name, code)
+        self.iata_codes = set(iata_by_name.values())
+        self.icao_to_iata = {
+            code: iata_by_name[name]
+            for code, name in airline_codes.items()
+            if len(code) == 3 and code.isalpha() and name in iata_by_name
+        }
+
+    @classmethod
+    def load(cls, path=AIRLINE_CODES_PATH):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def airline_code(self, callsign):
+        """IATA designator for a callsign's airline prefix, or None"""
+        callsign = callsign.strip().upper()
+        if callsign[:3] in self.icao_to_iata:
+            return self.icao_to_iata[callsign[:3]]
+        # "FDX12" must not fall back to "FD": only IATA-shaped callsigns (two characters, then digits)
+        if IATA_CALLSIGN_PATTERN.match(callsign) and callsign[:2] in self.iata_codes:
+            return callsign[:2]
+        return None
+
+    def flight_number(self, callsign):
+        """
+        Normalize a callsign or flight number to IATA form without leading zeros:
+        "UAL0123" / "UA123" / "ua 123" -> "UA123". None if it does not look like one.
+        """
+        compact = callsign.replace(' ', '').upper()
+        match = CALLSIGN_PATTERN.match(compact)
+        if not match:
+            return None
+        prefix, number = match.groups()
+        airline = self.icao_to_iata.get(prefix) if len(prefix) == 3 else (prefix if prefix in self.iata_codes else None)
+        return f"{airline}{number}" if airline else None
+
+class RouteStore:
+    """Read-only view over the routes table, opened on first use"""
+
+    def __init__(self, path=DEFAULT_ROUTE_DB_PATH, airline_codes_path=AIRLINE_CODES_PATH):
+        self.path = path
+        self.airline_codes_path = airline_codes_path
+        self._db = None
+        self._resolver = None
+        self._lock = threading.Lock()
+
+    @property
+    def resolver(self):
+        if self._resolver is None:
+            self._resolver = AirlineCodeResolver.load(self.airline_codes_path)
+        return self._resolver
+
+    def _connection(self):
+        if self._db is None and os.path.exists(self.path):
+            # Read-only URI so several enhancer processes can share one file safely
+            self._db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        return self._db
+
+    def lookup(self, callsign):
+        """Return (departure, arrival) for a callsign/flight number, or None"""
+        flight_number = self.resolver.flight_number(callsign)
+        if not flight_number:
+            return None
+        with self._lock:
+            db = self._connection()
+            if db is None:
+                return None
+            row = db.execute(
+                "SELECT departure, arrival FROM routes WHERE flight_number = ?", (flight_number,)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def lookup_many(self, callsigns, chunk_size=500):
+        """
+        Return {callsign: (departure, arrival)} for every callsign with a stored route.
+        Batched IN queries under one lock acquisition instead of a query per callsign.
+        """
+        callsigns_by_number = {}
+        for callsign in callsigns:
+            flight_number = self.resolver.flight_number(callsign)
+            if flight_number:
+                callsigns_by_number.setdefault(flight_number, []).append(callsign)
+        if not callsigns_by_number:
+            return {}
+
+        routes = {}
+        flight_numbers = list(callsigns_by_number)
+        with self._lock:
+            db = self._connection()
+            if db is None:
+                return {}
+            for start in range(0, len(flight_numbers), chunk_size):
+                chunk = flight_numbers[start:start + chunk_size]
+                rows = db.execute(
+                    f"SELECT flight_number, departure, arrival FROM routes WHERE flight_number IN "
+                    f"({','.join('?' * len(chunk))})", chunk
+                )
+                for flight_number, departure, arrival in rows:
+                    for callsign in callsigns_by_number[flight_number]:
+                        routes[callsign] = (departure, arrival)
+        return routes
+
+_route_store = None
+_route_store_lock = threading.Lock()
+
+def get_route_store():
+    """Process-wide RouteStore (nothing is read from disk until the first lookup)"""
+    global _route_store
+    with _route_store_lock:
+        if _route_store is None:
+            _route_store = RouteStore()
+        return _route_store
+
+def build_route_db(rows, db_path, resolver=None):
+    """
+    Write (flight_number, departure, arrival) rows to a fresh SQLite route table.
+    Flight numbers are normalized so ICAO and IATA spellings share one key.
+    Returns the number of routes stored.
+    """
+    resolver = resolver or AirlineCodeResolver.load()
+    temporary = f"{db_path}.tmp"
+    if os.path.exists(temporary):
+        os.unlink(temporary)
+
+    db = sqlite3.connect(temporary)
+    db.execute("PRAGMA journal_mode=OFF")
+    db.execute("PRAGMA synchronous=OFF")
+    db.execute('''
+        CREATE TABLE routes (
+            flight_number TEXT PRIMARY KEY,
+            departure TEXT NOT NULL,
+            arrival TEXT NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+    def normalized():
+        for flight_number, departure, arrival in rows:
+            key = resolver.flight_number(flight_number)
+            if key and departure and arrival:
+                yield key, departure.strip().upper(), arrival.strip().upper()
+
+    db.executemany("INSERT OR REPLACE INTO routes VALUES (?, ?, ?)", normalized())
+    db.commit()
+    count = db.execute("SELECT COUNT(*) FROM routes").fetchone()[0]
+    db.close()
+    os.replace(temporary, db_path)
+    return count
+
+def read_routes_csv(path):
+    """Yield (flight_number, departure, arrival) from a CSV with those column names"""
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            yield row.get('flight_number') or row.get('callsign', ''), row.get('departure'), row.get('arrival')
+
+def main():
+    """Offline builder for the route database"""
+    parser = argparse.ArgumentParser(description="Build the route database used by route-enhancer.py")
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('csv', help="CSV with flight_number,departure,arrival columns")
+    parser.add_argument('--db', default=DEFAULT_ROUTE_DB_PATH, help="output SQLite file")
+    args = parser.parse_args()
+
+    count = build_route_db(read_routes_csv(args.csv), args.db)
+    print(f"✅ Stored {count} routes in {args.db}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
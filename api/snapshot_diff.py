@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Snapshot diffing between polls
+Keeps the last reported state of every aircraft keyed by icao24 and turns each
+new poll into a delta: added aircraft (full records), updated aircraft (only
+the fields that moved past their thresholds) and removed icao24s.
+"""
+
+import json
+import os
+import threading
+
+from geo import haversine_km
+
+DEFAULT_THRESHOLDS = {
+    'position_m': 250.0,
+    'altitude_ft': 100.0,
+    'velocity_kts': 5.0,
+    'true_track_deg': 3.0,
+    'vertical_rate_fpm': 250.0
+}
+
+# Compared against a threshold; everything else in COMPARED_FIELDS must match exactly
+NUMERIC_THRESHOLDS = {
+    'altitude': 'altitude_ft',
+    'geo_altitude': 'altitude_ft',
+    'velocity': 'velocity_kts',
+    'true_track': 'true_track_deg',
+    'vertical_rate': 'vertical_rate_fpm'
+}
+POSITION_FIELDS = ('latitude', 'longitude', 'distance_km', 'bearing')
+EXACT_FIELDS = ('callsign', 'on_ground', 'squawk', 'spi', 'category', 'origin_country')
+
+def _angle_difference(a, b):
+    difference = abs(a - b) % 360.0
+    return min(difference, 360.0 - difference)
+
+class SnapshotTracker:
+    """Previous snapshot keyed by icao24, turned into added/updated/removed deltas"""
+
+    def __init__(self, thresholds=None, previous=None):
+        self.thresholds = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+        self.previous = previous or {}
+        self.lock = threading.Lock()
+
+    def _changes(self, old, new):
+        """Fields of new that differ from the last reported record beyond their thresholds"""
+        changes = {}
+
+        if None in (old.get('latitude'), old.get('longitude')):
+            moved = True
+        else:
+            moved = haversine_km(old['latitude'], old['longitude'], new['latitude'], new['longitude']) * 1000.0 \
+                >= self.thresholds['position_m']
+        if moved:
+            changes.update((field, new[field]) for field in POSITION_FIELDS if field in new)
+
+        for field, threshold_name in NUMERIC_THRESHOLDS.items():
+            if field not in new:
+                continue
+            before, after = old.get(field), new[field]
+            if before is None or after is None:
+                changed = before is not after
+            elif field == 'true_track':
+                changed = _angle_difference(before, after) >= self.thresholds[threshold_name]
+            else:
+                changed = abs(after - before) >= self.thresholds[threshold_name]
+            if changed:
+                changes[field] = after
+
+        for field in EXACT_FIELDS:
+            if field in new and old.get(field) != new[field]:
+                changes[field] = new[field]
+
+        return changes
+
+    def diff(self, flights):
+        """
+        Compare a new poll against the previous one.
+        Returns {'added': [flight], 'updated': [{'icao24', 'changes'}], 'removed': [icao24]}.
+        Only reported changes move the stored baseline, so slow drift still
+        triggers an update once it accumulates past a threshold.
+        """
+        with self.lock:
+            current = {flight['icao24']: flight for flight in flights}
+            added, updated = [], []
+
+            for icao, flight in current.items():
+                old = self.previous.get(icao)
+                if old is None:
+                    added.append(flight)
+                    self.previous[icao] = dict(flight)
+                    continue
+                changes = self._changes(old, flight)
+                if changes:
+                    updated.append({'icao24': icao, 'changes': changes})
+                    old.update(changes)
+                # Timestamps always advance silently so the stored record stays current
+                for field in ('time_position', 'last_contact'):
+                    if field in flight:
+                        old[field] = flight[field]
+
+            removed = [icao for icao in self.previous if icao not in current]
+            for icao in removed:
+                del self.previous[icao]
+
+            return {'added': added, 'updated': updated, 'removed': removed}
+
+    def save(self, path):
+        """Persist the baseline so one-shot invocations can diff across processes"""
+        with self.lock:
+            temporary = f"{path}.tmp"
+            with open(temporary, 'w') as f:
+                json.dump(self.previous, f, separators=(',', ':'))
+            os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path, thresholds=None):
+        """Restore a saved baseline (an empty one if the file does not exist yet)"""
+        previous = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                previous = json.load(f)
+        return cls(thresholds, previous)
+
+# Trackers kept warm by a long-lived process, one per home location / snapshot key
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+def get_snapshot_tracker(key, delta_config=None):
+    """
+    Return the tracker for a snapshot key. With config.delta.path the baseline is
+    loaded from that file on first use (and should be saved back after each diff).
+    """
+    delta_config = delta_config or {}
+    thresholds = {name: delta_config[name] for name in DEFAULT_THRESHOLDS if name in delta_config}
+    with _trackers_lock:
+        tracker = _trackers.get(key)
+        if tracker is None:
+            path = delta_config.get('path')
+            tracker = SnapshotTracker.load(path, thresholds) if path else SnapshotTracker(thresholds)
+            _trackers[key] = tracker
+        else:
+            tracker.thresholds.update(thresholds)
+        return tracker
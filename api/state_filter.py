@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+State vector filtering and unit conversion for fetch_opensky_flights
+Building a flight dict per surviving state is most of the cost, so the optional
+NumPy columnar path only pays off when it can skip dicts: it reads the filter
+fields of every state in one pass, filters, trims to the radius and applies the
+K-nearest limit on arrays, and builds dicts for the returned flights only.
+Without a radius/limit it does the scalar loop's work plus the array setup, so
+it is opt-in ("columnar": true) rather than automatic.
+"""
+
+from itertools import chain
+from operator import attrgetter, itemgetter
+
+from geo import distance_bearing_arrays, rank_by_distance
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+METERS_TO_FEET = 3.28084
+MPS_TO_KNOTS = 1.94384
+MPS_TO_FPM = 196.85
+
+# OpenSky states/all row order (StateVector attribute names)
+STATE_KEYS = (
+    'icao24', 'callsign', 'origin_country', 'time_position', 'last_contact', 'longitude', 'latitude',
+    'baro_altitude', 'on_ground', 'velocity', 'true_track', 'vertical_rate', 'sensors', 'geo_altitude',
+    'squawk', 'spi', 'position_source', 'category'
+)
+# The fields every state is filtered on: longitude, latitude, baro_altitude, on_ground
+_row_filter_fields = itemgetter(5, 6, 7, 8)
+_state_filter_fields = attrgetter('longitude', 'latitude', 'baro_altitude', 'on_ground')
+
+def state_to_flight(state, altitude_ft):
+    """Build the flight dict for one state vector (altitude already converted)"""
+    return {
+        'icao24': state.icao24,
+        'callsign': state.callsign.strip() if state.callsign else '',
+        'origin_country': state.origin_country,
+        'time_position': state.time_position,
+        'last_contact': state.last_contact,
+        'longitude': state.longitude,
+        'latitude': state.latitude,
+        'altitude': altitude_ft,
+        'on_ground': state.on_ground,
+        'velocity': state.velocity * MPS_TO_KNOTS if state.velocity else 0,  # m/s to knots
+        'true_track': state.true_track,
+        'vertical_rate': state.vertical_rate * MPS_TO_FPM if state.vertical_rate else 0,  # m/s to ft/min
+        'sensors': state.sensors,
+        'geo_altitude': state.geo_altitude * METERS_TO_FEET if state.geo_altitude else 0,
+        'squawk': state.squawk,
+        'spi': state.spi,
+        'position_source': state.position_source,
+        'category': state.category if hasattr(state, 'category') else 0
+    }
+
+def filter_states(states, min_altitude_ft, max_altitude_ft):
+    """Drop ground/position-less/out-of-window states and convert the rest to flight dicts"""
+    flights = []
+    for state in states:
+        # Skip invalid or ground flights
+        if not state or state.on_ground or not state.latitude or not state.longitude:
+            continue
+
+        # Convert altitude from meters to feet
+        altitude_ft = state.baro_altitude * METERS_TO_FEET if state.baro_altitude else 0
+
+        # Check altitude filters
+        if not (min_altitude_ft <= altitude_ft <= max_altitude_ft):
+            continue
+
+        flights.append(state_to_flight(state, altitude_ft))
+
+    return flights
+
+def row_to_flight(row, altitude_ft):
+    """state_to_flight for a states/all row"""
+    callsign, velocity, vertical_rate, geo_altitude = row[1], row[9], row[11], row[13]
+    return {
+        'icao24': row[0],
+        'callsign': callsign.strip() if callsign else '',
+        'origin_country': row[2],
+        'time_position': row[3],
+        'last_contact': row[4],
+        'longitude': row[5],
+        'latitude': row[6],
+        'altitude': altitude_ft,
+        'on_ground': row[8],
+        'velocity': velocity * MPS_TO_KNOTS if velocity else 0,
+        'true_track': row[10],
+        'vertical_rate': vertical_rate * MPS_TO_FPM if vertical_rate else 0,
+        'sensors': row[12],
+        'geo_altitude': geo_altitude * METERS_TO_FEET if geo_altitude else 0,
+        'squawk': row[14],
+        'spi': row[15],
+        'position_source': row[16],
+        'category': row[17] if len(row) > 17 else 0
+    }
+
+def filter_states_columnar(states, min_altitude_ft, max_altitude_ft, lat=None, lon=None, radius_km=None,
+                           limit=None):
+    """
+    NumPy version of filter_states (plus rank_by_distance when lat/lon/radius_km
+    are given) with identical output. states are StateVectors or raw states/all
+    rows. The four filter fields of every state go into one float table in a
+    single pass (None as NaN); dicts are only built for the flights returned.
+    """
+    states = [state for state in states if state]
+    if not states:
+        return []
+
+    raw_rows = isinstance(states[0], (list, tuple))
+    fields = _row_filter_fields if raw_rows else _state_filter_fields
+    table = np.fromiter(chain.from_iterable(map(fields, states)), dtype=float, count=4 * len(states))
+    table = np.nan_to_num(table.reshape(len(states), 4))
+    longitude, latitude, on_ground = table[:, 0], table[:, 1], table[:, 3]
+    altitude_ft = table[:, 2] * METERS_TO_FEET
+
+    mask = (
+        (on_ground == 0)
+        & (latitude != 0)
+        & (longitude != 0)
+        & (altitude_ft >= min_altitude_ft)
+        & (altitude_ft <= max_altitude_ft)
+    )
+    survivors = np.flatnonzero(mask)
+    to_flight = row_to_flight if raw_rows else state_to_flight
+
+    if lat is None:
+        selected = survivors
+    else:
+        # Same positions in the same order as rank_by_distance gets from filter_states, so the same distances
+        distances, bearings = distance_bearing_arrays(lat, lon, latitude[survivors], longitude[survivors])
+        inside = np.flatnonzero(distances <= radius_km)
+        ranked = sorted(zip((round(distance, 2) for distance in distances[inside].tolist()), inside.tolist()))
+        if limit:
+            ranked = ranked[:limit]
+        positions = [position for _, position in ranked]
+        selected = survivors[positions]
+
+    # Falsy altitudes come out as integer 0, exactly like the scalar path
+    flights = [
+        to_flight(states[i], altitude if altitude else 0)
+        for i, altitude in zip(selected.tolist(), altitude_ft[selected].tolist())
+    ]
+    if lat is not None:
+        for flight, (distance_km, _), bearing in zip(flights, ranked, bearings[positions].tolist()):
+            flight['distance_km'] = distance_km
+            flight['bearing'] = round(bearing, 1)
+    return flights
+
+def filter_and_rank_states(states, min_altitude_ft, max_altitude_ft, lat, lon, radius_km, limit=None, columnar=None):
+    """
+    filter_states then rank_by_distance (flights inside radius_km, nearest first,
+    at most limit). columnar=True runs both in the NumPy path, which only builds
+    dicts for the flights it returns; False/None use the scalar loop.
+    """
+    if columnar and not NUMPY_AVAILABLE:
+        raise RuntimeError("Columnar state filtering requires numpy (pip install numpy)")
+    if columnar:
+        return filter_states_columnar(states, min_altitude_ft, max_altitude_ft, lat, lon, radius_km, limit)
+    return rank_by_distance(filter_states(states, min_altitude_ft, max_altitude_ft), lat, lon, radius_km, limit)
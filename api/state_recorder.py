@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""
+Append-only columnar recording of polled state vectors
+A recording is a directory with one little-endian fixed-width file per column
+(<name>.col), a dictionary of strings for the icao24/callsign/country columns
+(strings.jsonl, id = line number, 0 = null) and a time index (index.bin: one
+recorded_at/first_row/row_count entry per poll). Every file is only ever
+appended to and the index entry is written last, so readers memory-map the
+files while a poller keeps recording and never see a half-written poll. A
+writer holds an exclusive lock on writer.lock, so only one records at a time.
+
+Queries only touch the index and the row range of the polls inside [t0, t1]:
+latitude/longitude are prefiltered straight from the mapped columns and only
+matching rows are decoded. Positions are stored as float32 (~1m).
+
+    python3 api/state_recorder.py info RECORDING
+    python3 api/state_recorder.py query RECORDING --from T0 --to T1 --lat 39.86 --lon -104.67 --radius-km 25
+    python3 api/state_recorder.py replay RECORDING --lat 39.86 --lon -104.67 [--speed 60] [--enhance]
+"""
+
+import argparse
+import fcntl
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from math import cos, radians
+
+from geo import distances_and_bearings
+from instrumentation import count, log_info
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+FORMAT = 'airview-states'
+FORMAT_VERSION = 1
+
+# OpenSky states/all row order
+STATE_KEYS = [
+    'icao24', 'callsign', 'origin_country', 'time_position', 'last_contact', 'longitude', 'latitude',
+    'baro_altitude', 'on_ground', 'velocity', 'true_track', 'vertical_rate', 'sensors', 'geo_altitude',
+    'squawk', 'spi', 'position_source', 'category'
+]
+
+# (column, struct code): I = dictionary id or epoch seconds (0 = null), f = float32 (NaN = null),
+# H = 4-digit squawk as a number (NO_SQUAWK = null), B = small codes; flags holds on_ground (bit 0) and spi (bit 1)
+COLUMNS = (
+    ('icao24', 'I'), ('callsign', 'I'), ('origin_country', 'I'),
+    ('time_position', 'I'), ('last_contact', 'I'),
+    ('longitude', 'f'), ('latitude', 'f'), ('baro_altitude', 'f'), ('velocity', 'f'),
+    ('true_track', 'f'), ('vertical_rate', 'f'), ('geo_altitude', 'f'),
+    ('squawk', 'H'), ('flags', 'B'), ('position_source', 'B'), ('category', 'B')
+)
+STRING_COLUMNS = ('icao24', 'callsign', 'origin_country')
+FLOAT_COLUMNS = ('longitude', 'latitude', 'baro_altitude', 'velocity', 'true_track', 'vertical_rate', 'geo_altitude')
+NO_SQUAWK = 0xFFFF
+
+INDEX = struct.Struct('<dQI')
+NAN = float('nan')
+
+def _column_path(path, name):
+    return os.path.join(path, f"{name}.col")
+
+def _index_path(path):
+    return os.path.join(path, 'index.bin')
+
+def _strings_path(path):
+    return os.path.join(path, 'strings.jsonl')
+
+def _lock_path(path):
+    return os.path.join(path, 'writer.lock')
+
+class RecordingLockedError(RuntimeError):
+    """Another StateRecorder (in this or another process) is writing the recording"""
+
+def _check_meta(path, create=False):
+    """Write meta.json for a new recording, or verify an existing one matches this format"""
+    meta_path = os.path.join(path, 'meta.json')
+    meta = {'format': FORMAT, 'version': FORMAT_VERSION, 'columns': [list(column) for column in COLUMNS]}
+    if not os.path.exists(meta_path):
+        if not create:
+            raise ValueError(f"{path} is not a state recording")
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f)
+        return
+    with open(meta_path) as f:
+        existing = json.load(f)
+    if existing != meta:
+        raise ValueError(f"{path} was recorded in an incompatible format ({existing.get('format')} "
+                         f"v{existing.get('version')})")
+
+def _state_values(state):
+    """OpenSky row (list) or StateVector-like object as a {key: value} dict"""
+    if isinstance(state, (list, tuple)):
+        return dict(zip(STATE_KEYS, state))
+    return {key: getattr(state, key, None) for key in STATE_KEYS}
+
+def _squawk_code(squawk):
+    try:
+        return int(squawk) if squawk and len(squawk) == 4 else NO_SQUAWK
+    except (TypeError, ValueError):
+        return NO_SQUAWK
+
+class StateRecorder:
+    """Appends polls to a recording directory; holds its writer lock until close()"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        # Writers hand out string ids from their own dictionary and recovery truncates
+        # unindexed rows, so a second writer would corrupt the recording
+        self.lock_file = open(_lock_path(path), 'a')
+        try:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self.lock_file.close()
+            raise RecordingLockedError(f"{path} is already being recorded by another writer")
+        try:
+            _check_meta(path, create=True)
+            self._recover()
+        except Exception:
+            self.lock_file.close()
+            raise
+        self.index_file = open(_index_path(path), 'ab')
+        self.strings_file = open(_strings_path(path), 'ab')
+        self.column_files = {name: open(_column_path(path, name), 'ab') for name, _ in COLUMNS}
+
+    def _recover(self):
+        """Drop anything a crashed writer appended after its last complete index entry"""
+        index_path = _index_path(self.path)
+        size = os.path.getsize(index_path) if os.path.exists(index_path) else 0
+        self.snapshots = size // INDEX.size
+        self.rows, self.last_recorded_at = 0, None
+        with open(index_path, 'ab+') as f:
+            f.truncate(self.snapshots * INDEX.size)
+            if self.snapshots:
+                f.seek((self.snapshots - 1) * INDEX.size)
+                self.last_recorded_at, first_row, rows = INDEX.unpack(f.read(INDEX.size))
+                self.rows = first_row + rows
+
+        for name, code in COLUMNS:
+            with open(_column_path(self.path, name), 'ab+') as f:
+                f.truncate(self.rows * struct.calcsize(code))
+
+        strings_path = _strings_path(self.path)
+        with open(strings_path, 'ab+') as f:
+            f.seek(0)
+            data = f.read()
+            complete = data[:data.rfind(b'\n') + 1]
+            if len(complete) != len(data):
+                f.truncate(len(complete))
+            if not complete:
+                f.write(b'null\n')
+                complete = b'null\n'
+        self.string_ids = {json.loads(line): position for position, line in enumerate(complete.splitlines())}
+
+    def _string_id(self, value, new_strings):
+        value = value.strip() if isinstance(value, str) else value
+        if not value:
+            return 0
+        string_id = self.string_ids.get(value)
+        if string_id is None:
+            string_id = self.string_ids[value] = len(self.string_ids)
+            new_strings.append(json.dumps(value))
+        return string_id
+
+    def append(self, states, recorded_at=None):
+        """
+        Record one poll (OpenSky rows or StateVector objects) at recorded_at
+        (epoch seconds, default now; never earlier than the previous poll).
+        Returns the number of states written.
+        """
+        with self.lock:
+            recorded_at = time.time() if recorded_at is None else recorded_at
+            if self.last_recorded_at is not None:
+                recorded_at = max(recorded_at, self.last_recorded_at)
+
+            columns = {name: [] for name, _ in COLUMNS}
+            new_strings = []
+            for state in states:
+                values = _state_values(state)
+                for name in STRING_COLUMNS:
+                    columns[name].append(self._string_id(values[name], new_strings))
+                for name in ('time_position', 'last_contact'):
+                    columns[name].append(int(values[name] or 0))
+                for name in FLOAT_COLUMNS:
+                    value = values[name]
+                    columns[name].append(NAN if value is None else value)
+                columns['squawk'].append(_squawk_code(values['squawk']))
+                columns['flags'].append((1 if values['on_ground'] else 0) | (2 if values['spi'] else 0))
+                columns['position_source'].append(values['position_source'] or 0)
+                columns['category'].append(values['category'] or 0)
+
+            rows = len(columns['icao24'])
+            if new_strings:
+                self.strings_file.write(('\n'.join(new_strings) + '\n').encode('utf-8'))
+                self.strings_file.flush()
+            for name, code in COLUMNS:
+                self.column_files[name].write(struct.pack(f'<{rows}{code}', *columns[name]))
+                self.column_files[name].flush()
+            # The index entry commits the poll
+            self.index_file.write(INDEX.pack(recorded_at, self.rows, rows))
+            self.index_file.flush()
+
+            self.rows += rows
+            self.snapshots += 1
+            self.last_recorded_at = recorded_at
+
+        count('recorder_snapshots_total')
+        count('recorder_states_total', rows)
+        return rows
+
+    def close(self):
+        with self.lock:
+            for f in [self.index_file, self.strings_file] + list(self.column_files.values()):
+                f.close()
+            # Closing the lock file releases the writer lock
+            self.lock_file.close()
+
+class StateRecording:
+    """Read-only, memory-mapped view of a recording; picks up polls appended since the last call"""
+
+    def __init__(self, path):
+        _check_meta(path)
+        self.path = path
+        self.snapshots = 0
+        self._maps = {}
+        self._strings = []
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self):
+        """Re-map the files when the writer has committed more polls; returns the poll count"""
+        size = os.path.getsize(_index_path(self.path))
+        with self._lock:
+            if size // INDEX.size != self.snapshots:
+                maps = {}
+                if size:
+                    for name, path in [('index', _index_path(self.path))] + \
+                            [(name, _column_path(self.path, name)) for name, _ in COLUMNS]:
+                        with open(path, 'rb') as f:
+                            maps[name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) \
+                                if os.fstat(f.fileno()).st_size else b''
+                for mapped in self._maps.values():
+                    if isinstance(mapped, mmap.mmap):
+                        mapped.close()
+                self._maps = maps
+                # Only polls whose rows are fully mapped count (index entries are written last)
+                self.snapshots = len(maps['index']) // INDEX.size if maps else 0
+        return self.snapshots
+
+    def __len__(self):
+        return self.refresh()
+
+    def snapshot(self, position):
+        """(recorded_at, first_row, rows) of one poll"""
+        return INDEX.unpack_from(self._maps['index'], position * INDEX.size)
+
+    def time_range(self):
+        """(first, last) recorded_at, or None for an empty recording"""
+        if not self.refresh():
+            return None
+        return self.snapshot(0)[0], self.snapshot(self.snapshots - 1)[0]
+
+    def find(self, recorded_at):
+        """Position of the first poll recorded at or after recorded_at (binary search of the time index)"""
+        low, high = 0, self.snapshots
+        while low < high:
+            middle = (low + high) // 2
+            if self.snapshot(middle)[0] < recorded_at:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _string(self, string_id):
+        if string_id >= len(self._strings):
+            with open(_strings_path(self.path), 'rb') as f:
+                self._strings = [json.loads(line) for line in f.read().splitlines()]
+        return self._strings[string_id]
+
+    def _value(self, name, code, row):
+        return struct.unpack_from(f'<{code}', self._maps[name], row * struct.calcsize(code))[0]
+
+    def row(self, row):
+        """One recorded state as an OpenSky states/all row"""
+        values = {name: self._value(name, code, row) for name, code in COLUMNS}
+        for name in STRING_COLUMNS:
+            values[name] = self._string(values[name])
+        for name in ('time_position', 'last_contact'):
+            values[name] = values[name] or None
+        for name in FLOAT_COLUMNS:
+            if values[name] != values[name]:
+                values[name] = None
+        values['squawk'] = format(values['squawk'], '04d') if values['squawk'] != NO_SQUAWK else None
+        values['on_ground'] = bool(values['flags'] & 1)
+        values['spi'] = bool(values['flags'] & 2)
+        values['sensors'] = None
+        return [values[key] for key in STATE_KEYS]
+
+    def rows(self, position):
+        """Every state of one poll as OpenSky rows"""
+        _, first_row, rows = self.snapshot(position)
+        return [self.row(row) for row in range(first_row, first_row + rows)]
+
+    def _floats(self, name, start, end):
+        """float32 column values for rows [start, end) without copying the rest of the file"""
+        if NUMPY_AVAILABLE:
+            return np.frombuffer(self._maps[name], dtype='<f4', count=end - start, offset=start * 4)
+        values = array('f')
+        values.frombytes(self._maps[name][start * 4:end * 4])
+        if sys.byteorder == 'big':
+            values.byteswap()
+        return values
+
+    def _rows_in_box(self, start, end, lamin, lamax, lomin, lomax):
+        lats = self._floats('latitude', start, end)
+        lons = self._floats('longitude', start, end)
+        if NUMPY_AVAILABLE:
+            # NaN (no position) compares false and drops out
+            mask = (lats >= lamin) & (lats <= lamax) & (lons >= lomin) & (lons <= lomax)
+            return (np.nonzero(mask)[0] + start).tolist()
+        return [start + offset for offset, (lat, lon) in enumerate(zip(lats, lons))
+                if lamin <= lat <= lamax and lomin <= lon <= lomax]
+
+    def query(self, t0, t1, lat, lon, radius_km):
+        """
+        Every state recorded by polls in [t0, t1] within radius_km of (lat, lon),
+        as flight-shaped dicts (OpenSky units) with recorded_at, distance_km and
+        bearing, in recording order
+        """
+        if not self.refresh():
+            return []
+        first, last = self.find(t0), self.find(t1)
+        while last < self.snapshots and self.snapshot(last)[0] <= t1:
+            last += 1
+        if first >= last:
+            return []
+
+        polls = [self.snapshot(position) for position in range(first, last)]
+        start, end = polls[0][1], polls[-1][1] + polls[-1][2]
+        lat_delta = radius_km / 111.0
+        lon_delta = radius_km / (111.0 * max(abs(cos(radians(lat))), 1e-6))
+        lomin, lomax = lon - lon_delta, lon + lon_delta
+        if lomin < -180.0 or lomax > 180.0:
+            lomin, lomax = -180.0, 180.0
+        candidates = self._rows_in_box(start, end, lat - lat_delta, lat + lat_delta, lomin, lomax)
+
+        states = [dict(zip(STATE_KEYS, self.row(row))) for row in candidates]
+        distances, bearings = distances_and_bearings(lat, lon, [state['latitude'] for state in states],
+                                                     [state['longitude'] for state in states])
+        first_rows = [poll[1] for poll in polls]
+        matches = []
+        for row, state, distance, bearing in zip(candidates, states, distances, bearings):
+            if distance <= radius_km:
+                state['recorded_at'] = polls[bisect_right(first_rows, row) - 1][0]
+                state['distance_km'] = round(distance, 2)
+                state['bearing'] = round(bearing, 1)
+                matches.append(state)
+        count('recorder_queries_total')
+        return matches
+
+# Recorders shared by every request a long-lived process serves, one per recording directory
+_recorders = {}
+_recorders_lock = threading.Lock()
+
+def get_state_recorder(path):
+    """Return the process-wide StateRecorder for a recording directory"""
+    path = os.path.abspath(path)
+    with _recorders_lock:
+        recorder = _recorders.get(path)
+        if recorder is None:
+            recorder = _recorders[path] = StateRecorder(path)
+        return recorder
+
+def replay(path, lat, lon, radius_km=50.0, speed=60.0, enhance=False, max_in_flight=16):
+    """
+    Feed every recorded poll back through the enhancer's bbox request path,
+    spaced by the recorded gaps divided by speed (0 = as fast as possible),
+    against a fake OpenSky API serving the recording. Yields one summary per poll.
+    """
+    import importlib.util
+    from fake_opensky_server import start_fake_opensky_server
+
+    spec = importlib.util.spec_from_file_location(
+        'python_flight_enhancer', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python-flight-enhancer.py'))
+    enhancer = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(enhancer)
+
+    server = start_fake_opensky_server(replay=path)
+    recording = server.recording
+    request = {
+        'bbox': {'lat': lat, 'lon': lon, 'radius_km': radius_km},
+        'enhance': enhance,
+        'config': {'opensky': {'api_url': server.api_url, 'requests_per_second': 1e6, 'burst': 1e6,
+                               'max_in_flight': max_in_flight}}
+    }
+    try:
+        started, first_recorded_at = time.monotonic(), None
+        for position in range(len(recording)):
+            recorded_at = recording.snapshot(position)[0]
+            first_recorded_at = recorded_at if first_recorded_at is None else first_recorded_at
+            if speed:
+                delay = (recorded_at - first_recorded_at) / speed - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+
+            server.replay_position = position
+            request_start = time.perf_counter()
+            result = enhancer.handle_request(request)
+            flights = result.get('flights', []) if isinstance(result, dict) else result
+            yield {
+                'recorded_at': recorded_at,
+                'flights': len(flights),
+                'elapsed_s': round(time.perf_counter() - request_start, 3)
+            }
+    finally:
+        server.shutdown()
+
+def main():
+    """Inspect, query or replay a recording"""
+    parser = argparse.ArgumentParser(description="Query or replay a state vector recording")
+    parser.add_argument('command', choices=['info', 'query', 'replay'])
+    parser.add_argument('recording', help="recording directory (config.record.path)")
+    parser.add_argument('--from', dest='t0', type=float, default=0.0, help="query start (epoch seconds)")
+    parser.add_argument('--to', dest='t1', type=float, default=float('inf'), help="query end (epoch seconds)")
+    parser.add_argument('--lat', type=float, default=39.8561)
+    parser.add_argument('--lon', type=float, default=-104.6737)
+    parser.add_argument('--radius-km', type=float, default=50.0)
+    parser.add_argument('--speed', type=float, default=60.0, help="replay speed-up (0 = as fast as possible)")
+    parser.add_argument('--enhance', action='store_true', help="replay with enhancement")
+    args = parser.parse_args()
+
+    if args.command == 'info':
+        recording = StateRecording(args.recording)
+        time_range = recording.time_range()
+        rows = sum(recording.snapshot(position)[2] for position in range(recording.snapshots))
+        print(json.dumps({'polls': recording.snapshots, 'states': rows,
+                          'first_recorded_at': time_range[0] if time_range else None,
+                          'last_recorded_at': time_range[1] if time_range else None}, indent=2))
+    elif args.command == 'query':
+        states = StateRecording(args.recording).query(args.t0, args.t1, args.lat, args.lon, args.radius_km)
+        log_info(f"✅ {len(states)} states matched")
+        print(json.dumps(states, indent=2))
+    else:
+        for summary in replay(args.recording, args.lat, args.lon, args.radius_km, args.speed, args.enhance):
+            print(json.dumps(summary, separators=(',', ':')), flush=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Tile-based shared bbox fetching
+Home locations snap their bounding boxes onto a fixed lat/lon tile grid. Tiles
+that are not cached are merged into as few rectangular states/all queries as
+possible, and each answer is split back into per-tile snapshots that live for
+a short TTL. Concurrent requests that need a tile already being fetched wait
+for that fetch instead of issuing their own, so upstream calls grow with the
+area covered rather than with the number of displays.
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from math import floor
+
+from instrumentation import count, log_debug
+
+DEFAULT_TILE_DEG = 1.0
+DEFAULT_TILE_TTL_S = 10.0
+COALESCE_TIMEOUT_S = 30.0
+
+class TileGrid:
+    """Fixed grid of tile_deg x tile_deg tiles addressed by (row, column)"""
+
+    def __init__(self, tile_deg=DEFAULT_TILE_DEG):
+        self.tile_deg = tile_deg
+        self.rows = int(round(180.0 / tile_deg))
+        self.columns = int(round(360.0 / tile_deg))
+
+    def tile_of(self, lat, lon):
+        row = min(self.rows - 1, max(0, int(floor((lat + 90.0) / self.tile_deg))))
+        column = int(floor((lon + 180.0) / self.tile_deg)) % self.columns
+        return row, column
+
+    def tiles_for_bbox(self, bbox):
+        """Every tile a bbox (lamin/lamax/lomin/lomax) touches; longitudes wrap at the antimeridian"""
+        first_row, _ = self.tile_of(max(-90.0, bbox['lamin']), 0.0)
+        last_row, _ = self.tile_of(min(90.0, bbox['lamax']), 0.0)
+        first_column = int(floor((bbox['lomin'] + 180.0) / self.tile_deg))
+        last_column = int(floor((bbox['lomax'] + 180.0) / self.tile_deg))
+        if last_column - first_column >= self.columns:
+            first_column, last_column = 0, self.columns - 1
+        return {
+            (row, column % self.columns)
+            for row in range(first_row, last_row + 1)
+            for column in range(first_column, last_column + 1)
+        }
+
+    def rectangle_bbox(self, rectangle):
+        """(lamin, lamax, lomin, lomax) of a (first_row, last_row, first_column, last_column) rectangle"""
+        first_row, last_row, first_column, last_column = rectangle
+        return (
+            first_row * self.tile_deg - 90.0,
+            min(90.0, (last_row + 1) * self.tile_deg - 90.0),
+            first_column * self.tile_deg - 180.0,
+            min(180.0, (last_column + 1) * self.tile_deg - 180.0)
+        )
+
+def merge_tiles(tiles):
+    """
+    Cover a set of (row, column) tiles exactly with few rectangles: contiguous
+    runs per row, stacked while consecutive rows repeat the same run.
+    Returns [(first_row, last_row, first_column, last_column)].
+    """
+    columns_by_row = {}
+    for row, column in tiles:
+        columns_by_row.setdefault(row, []).append(column)
+
+    finished, open_rectangles = [], {}
+    for row in sorted(columns_by_row):
+        runs = []
+        for column in sorted(columns_by_row[row]):
+            if runs and column == runs[-1][1] + 1:
+                runs[-1][1] = column
+            else:
+                runs.append([column, column])
+
+        still_open = {}
+        for first_column, last_column in runs:
+            rectangle = open_rectangles.pop((first_column, last_column), None)
+            if rectangle and rectangle[1] == row - 1:
+                rectangle[1] = row
+            else:
+                if rectangle:
+                    finished.append(rectangle)
+                rectangle = [row, row, first_column, last_column]
+            still_open[(first_column, last_column)] = rectangle
+        finished.extend(open_rectangles.values())
+        open_rectangles = still_open
+    finished.extend(open_rectangles.values())
+    return [tuple(rectangle) for rectangle in sorted(finished)]
+
+def _rectangle_tiles(rectangle):
+    first_row, last_row, first_column, last_column = rectangle
+    return [(row, column) for row in range(first_row, last_row + 1) for column in range(first_column, last_column + 1)]
+
+class TileFetcher:
+    """
+    Per-tile snapshot cache in front of an upstream fetch(bbox) -> [state] function.
+    States are anything with .latitude/.longitude (opensky_api StateVectors).
+    """
+
+    def __init__(self, fetch, tile_deg=DEFAULT_TILE_DEG, ttl_s=DEFAULT_TILE_TTL_S, clock=time.monotonic):
+        self.fetch = fetch
+        self.grid = TileGrid(tile_deg)
+        self.ttl_s = ttl_s
+        self.clock = clock
+        self.tiles = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def states_for_bbox(self, bbox):
+        """States in every tile the bbox touches (callers trim to their own radius)"""
+        return self.states_for_tiles(self.grid.tiles_for_bbox(bbox))
+
+    def states_for_tiles(self, wanted):
+        now = self.clock()
+        states, waiting, missing = [], {}, []
+        with self.lock:
+            self.tiles = {tile: entry for tile, entry in self.tiles.items() if now - entry[0] < self.ttl_s}
+            for tile in wanted:
+                if tile in self.tiles:
+                    states.extend(self.tiles[tile][1])
+                elif tile in self.pending:
+                    waiting[tile] = self.pending[tile]
+                else:
+                    missing.append(tile)
+
+            # Claim the missing tiles so concurrent callers wait on our fetches
+            owned = []
+            for rectangle in merge_tiles(missing):
+                future = Future()
+                for tile in _rectangle_tiles(rectangle):
+                    self.pending[tile] = future
+                owned.append((rectangle, future))
+
+        count('tile_hits_total', len(wanted) - len(waiting) - len(missing))
+        count('tile_coalesced_total', len(waiting))
+        count('tile_misses_total', len(missing))
+
+        error = None
+        for rectangle, future in owned:
+            try:
+                by_tile = self._fetch_rectangle(rectangle)
+            except Exception as e:
+                with self.lock:
+                    for tile in _rectangle_tiles(rectangle):
+                        self.pending.pop(tile, None)
+                future.set_exception(e)
+                error = error or e
+                continue
+            future.set_result(by_tile)
+            for tile in _rectangle_tiles(rectangle):
+                if tile in wanted:
+                    states.extend(by_tile.get(tile, []))
+
+        for tile, future in waiting.items():
+            states.extend(future.result(timeout=COALESCE_TIMEOUT_S).get(tile, []))
+
+        if error:
+            raise error
+        return states
+
+    def _fetch_rectangle(self, rectangle):
+        """One upstream query for a merged rectangle, split into fresh per-tile snapshots"""
+        bbox = self.grid.rectangle_bbox(rectangle)
+        count('tile_upstream_queries_total')
+        log_debug(f"🧩 Fetching {len(_rectangle_tiles(rectangle))} tiles as one bbox {bbox}")
+        states = self.fetch(bbox)
+
+        by_tile = {tile: [] for tile in _rectangle_tiles(rectangle)}
+        for state in states:
+            if state.latitude is None or state.longitude is None:
+                continue
+            tile = self.grid.tile_of(state.latitude, state.longitude)
+            if tile in by_tile:
+                by_tile[tile].append(state)
+
+        fetched_at = self.clock()
+        with self.lock:
+            for tile, tile_states in by_tile.items():
+                self.tiles[tile] = (fetched_at, tile_states)
+                self.pending.pop(tile, None)
+        return by_tile
+
+# Tile caches shared by every request (and every display) a long-lived process serves
+_tile_fetchers = {}
+_tile_fetchers_lock = threading.Lock()
+
+def get_tile_fetcher(key, fetch, tiles_config=None):
+    """Return the shared TileFetcher for a key (e.g. the credentials), creating it with config.tiles settings"""
+    tiles_config = tiles_config or {}
+    with _tile_fetchers_lock:
+        fetcher = _tile_fetchers.get(key)
+        tile_deg = tiles_config.get('tile_deg', DEFAULT_TILE_DEG)
+        if fetcher is None or fetcher.grid.tile_deg != tile_deg:
+            fetcher = _tile_fetchers[key] = TileFetcher(fetch, tile_deg, tiles_config.get('ttl_s', DEFAULT_TILE_TTL_S))
+        else:
+            # The latest request's upstream function (client settings, recording) wins
+            fetcher.fetch = fetch
+            fetcher.ttl_s = tiles_config.get('ttl_s', fetcher.ttl_s)
+        return fetcher
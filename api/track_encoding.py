@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Track simplification and compact track encodings
+Tracks arrive as one dict per waypoint. The display only draws a short trail,
+so tracks can be simplified to a tolerance in meters (Douglas-Peucker) and
+emitted as parallel arrays or as an encoded polyline with delta-coded times.
+"""
+
+import json
+from math import cos, radians
+
+from geo import EARTH_RADIUS_KM
+
+TRACK_FIELDS = ['time', 'latitude', 'longitude', 'altitude', 'true_track', 'on_ground']
+ENCODINGS = ('objects', 'columns', 'polyline')
+
+EARTH_RADIUS_M = EARTH_RADIUS_KM * 1000.0
+
+def _project(points):
+    """Equirectangular projection to meters around the track's first point (fine at track scale)"""
+    lat0 = points[0]['latitude']
+    lon0 = points[0]['longitude']
+    x_scale = radians(1) * EARTH_RADIUS_M * cos(radians(lat0))
+    y_scale = radians(1) * EARTH_RADIUS_M
+    return [
+        ((point['longitude'] - lon0) * x_scale, (point['latitude'] - lat0) * y_scale)
+        for point in points
+    ]
+
+def _segment_distance(px, py, ax, ay, bx, by):
+    """Distance from point P to segment AB in projected meters"""
+    dx, dy = bx - ax, by - ay
+    length_sq = dx * dx + dy * dy
+    if length_sq == 0:
+        return ((px - ax) ** 2 + (py - ay) ** 2) ** 0.5
+    t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / length_sq))
+    cx, cy = ax + t * dx, ay + t * dy
+    return ((px - cx) ** 2 + (py - cy) ** 2) ** 0.5
+
+def simplify_track(points, tolerance_m):
+    """
+    Douglas-Peucker simplification: keep the endpoints and every waypoint that
+    deviates more than tolerance_m from the simplified line. Iterative, so very
+    long tracks cannot hit the recursion limit.
+    """
+    if len(points) < 3 or not tolerance_m or tolerance_m <= 0:
+        return list(points)
+
+    projected = _project(points)
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+
+    while stack:
+        first, last = stack.pop()
+        ax, ay = projected[first]
+        bx, by = projected[last]
+        farthest, farthest_distance = None, tolerance_m
+        for i in range(first + 1, last):
+            distance = _segment_distance(projected[i][0], projected[i][1], ax, ay, bx, by)
+            if distance > farthest_distance:
+                farthest, farthest_distance = i, distance
+        if farthest is not None:
+            keep[farthest] = True
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+
+    return [point for point, kept in zip(points, keep) if kept]
+
+def _encode_signed(value):
+    """One value of Google's encoded polyline algorithm format"""
+    value = ~(value << 1) if value < 0 else value << 1
+    chunks = []
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+    return ''.join(chunks)
+
+def encode_polyline(coordinates, precision=5):
+    """Encode [(lat, lon), ...] as a Google polyline string"""
+    factor = 10 ** precision
+    encoded = []
+    previous_lat = previous_lon = 0
+    for lat, lon in coordinates:
+        lat_i, lon_i = int(round(lat * factor)), int(round(lon * factor))
+        encoded.append(_encode_signed(lat_i - previous_lat))
+        encoded.append(_encode_signed(lon_i - previous_lon))
+        previous_lat, previous_lon = lat_i, lon_i
+    return ''.join(encoded)
+
+def _deltas(values):
+    """First value followed by successive differences"""
+    return [values[0]] + [b - a for a, b in zip(values, values[1:])] if values else []
+
+def encode_track(points, encoding='objects'):
+    """
+    Encode track points:
+      objects  - the original list of per-point dicts
+      columns  - {field: [values...]} parallel arrays
+      polyline - lat/lon as a Google encoded polyline (1e-5 deg), delta-coded
+                 times and altitudes rounded to whole feet
+    """
+    if encoding == 'objects':
+        return points
+    if encoding == 'columns':
+        return {field: [point[field] for point in points] for field in TRACK_FIELDS}
+    if encoding == 'polyline':
+        return {
+            'polyline': encode_polyline([(point['latitude'], point['longitude']) for point in points]),
+            'time_deltas': _deltas([point['time'] for point in points]),
+            'altitude': [round(point['altitude']) if point['altitude'] is not None else None for point in points],
+            'true_track': [round(point['true_track']) if point['true_track'] is not None else None for point in points],
+            'on_ground': [point['on_ground'] for point in points]
+        }
+    raise ValueError(f"Unknown track encoding '{encoding}' (expected one of {', '.join(ENCODINGS)})")
+
+def _json_size(value):
+    return len(json.dumps(value, separators=(',', ':')))
+
+def compact_track(points, tolerance_m=None, encoding='objects'):
+    """
+    Simplify and encode a track for output.
+    Returns (encoded_track, stats) where stats holds before/after point counts and
+    compact-JSON byte sizes.
+    """
+    simplified = simplify_track(points, tolerance_m) if tolerance_m else points
+    encoded = encode_track(simplified, encoding)
+    stats = {
+        'points_before': len(points),
+        'points_after': len(simplified),
+        'bytes_before': _json_size(points),
+        'bytes_after': _json_size(encoded),
+        'encoding': encoding
+    }
+    return encoded, stats
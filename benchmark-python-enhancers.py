@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Benchmark Script: Python Enhancer Hot Paths
+
+Times the pure-Python stages of api/python-flight-enhancer.py and
+api/route-enhancer.py on synthetic data so regressions show up before they
+reach the kiosks. Run all sections, or name the ones you want:
+
+    python3 benchmark-python-enhancers.py [section ...] [--sizes 1000,10000]
+"""
+
+import argparse
+import copy
+import importlib.util
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from math import cos, radians
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api')
+sys.path.insert(0, API_DIR)
+
+from fake_opensky_server import synthetic_states
+import state_filter
+import airport_index
+import route_store
+import aircraft_registry
+import dead_reckoning
+import geo
+import poll_scheduler
+import tile_fetcher
+import state_recorder
+
+def load_script(filename, module_name):
+    """Import one of the hyphen-named api/ scripts as a module"""
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(API_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+STATE_KEYS = [
+    'icao24', 'callsign', 'origin_country', 'time_position', 'last_contact', 'longitude', 'latitude',
+    'baro_altitude', 'on_ground', 'velocity', 'true_track', 'vertical_rate', 'sensors', 'geo_altitude',
+    'squawk', 'spi', 'position_source', 'category'
+]
+
+class SyntheticState:
+    """Stand-in for opensky_api.StateVector built from a states/all row"""
+
+    __slots__ = STATE_KEYS
+
+    def __init__(self, row):
+        for key, value in zip(STATE_KEYS, row):
+            setattr(self, key, value)
+
+def make_states(count):
+    """Synthetic state vectors spread over a regional-dashboard sized area"""
+    return [SyntheticState(row) for row in synthetic_states(count, spread_deg=5.0)]
+
+def time_call(func, *args, repeat=5):
+    """Best-of-N wall time in milliseconds and the last result"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000.0, result
+
+def bench_filtering(sizes):
+    """Scalar vs NumPy columnar state filtering (and ranking) in fetch_opensky_flights"""
+    print("✅ State vector filtering (fetch_opensky_flights):")
+    if not state_filter.NUMPY_AVAILABLE:
+        print("   numpy not installed - timing the scalar path only")
+
+    # Filter only; the circle inscribed in the states' box (like a bbox poll, ~60% kept);
+    # a smaller 250km circle; and the inscribed circle keeping the 50 nearest
+    variants = [('filter', None, None), ('circle', 425.0, None), ('circle 250km', 250.0, None),
+                ('circle+limit', 425.0, 50)]
+    for size in sizes:
+        states = make_states(size)
+        for name, radius_km, limit in variants:
+            if radius_km is None:
+                scalar = lambda: state_filter.filter_states(states, 0, 45000)
+                columnar = lambda: state_filter.filter_states_columnar(states, 0, 45000)
+            else:
+                scalar = lambda: state_filter.filter_and_rank_states(
+                    states, 0, 45000, 39.8561, -104.6737, radius_km, limit)
+                columnar = lambda: state_filter.filter_and_rank_states(
+                    states, 0, 45000, 39.8561, -104.6737, radius_km, limit, columnar=True)
+
+            scalar_ms, scalar_result = time_call(scalar)
+            line = f"   {size:>6} states {name:<12}: scalar {scalar_ms:8.2f}ms"
+            if state_filter.NUMPY_AVAILABLE:
+                columnar_ms, columnar_result = time_call(columnar)
+                identical = columnar_result == scalar_result and all(
+                    type(a[key]) is type(b[key])
+                    for a, b in zip(columnar_result, scalar_result)
+                    for key in ('altitude', 'velocity', 'vertical_rate', 'geo_altitude')
+                )
+                line += (f" | columnar {columnar_ms:8.2f}ms | speedup {scalar_ms / columnar_ms:5.2f}x"
+                         f" | identical: {'yes' if identical else 'NO'}")
+            print(f"{line} | kept {len(scalar_result)}")
+    print()
+
+def bench_airports(sizes):
+    """Nearest-airport index: startup load and bulk lookups near track endpoints"""
+    print("✅ Nearest-airport index (track route inference):")
+
+    start = time.perf_counter()
+    index = airport_index.AirportIndex.load(airport_index.AIRPORT_INDEX_PATH)
+    load_ms = (time.perf_counter() - start) * 1000.0
+
+    with open(airport_index.AIRPORT_COORDS_PATH) as f:
+        coords = json.load(f)
+    build_ms, _ = time_call(airport_index.AirportIndex.build, coords, repeat=1)
+    print(f"   {len(index)} airports: load serialized {load_ms:.2f}ms | build from coordinates {build_ms:.2f}ms")
+
+    rng = random.Random(7)
+    for size in sizes:
+        # Half the points sit near a real airport, half are random over North America
+        points = []
+        for i in range(size):
+            if i % 2:
+                lat, lon = coords[rng.choice(list(coords))]
+                points.append((lat + rng.uniform(-0.05, 0.05), lon + rng.uniform(-0.05, 0.05)))
+            else:
+                points.append((rng.uniform(25, 50), rng.uniform(-125, -70)))
+
+        elapsed_ms, matches = time_call(lambda: [index.nearest(lat, lon, 8.0) for lat, lon in points], repeat=3)
+        found = sum(1 for match in matches if match)
+        print(f"   {size:>6} lookups: {elapsed_ms:8.2f}ms | {elapsed_ms * 1000.0 / size:6.2f}μs/lookup | matched {found}")
+    print()
+
+def synthetic_routes(count, rng):
+    """Unique (flight_number, departure, arrival) rows across the airlines with ICAO codes"""
+    resolver = route_store.AirlineCodeResolver.load()
+    # One ICAO designator per IATA code, so every generated flight number stays unique
+    airlines = sorted({iata: icao for icao, iata in sorted(resolver.icao_to_iata.items())}.values())
+    airports = ['DEN', 'SFO', 'LAX', 'ORD', 'ATL', 'DFW', 'JFK', 'SEA', 'PHX', 'LAS', 'MSP', 'SLC']
+    per_airline = count // len(airlines) + 1
+    rows = []
+    for airline in airlines:
+        for number in range(1, per_airline + 1):
+            rows.append((f"{airline}{number}", rng.choice(airports), rng.choice(airports)))
+    return rows[:count]
+
+def bench_routes(sizes):
+    """SQLite route store: build, lazy open and lookups at 100k+ routes"""
+    print("✅ Route store (route-enhancer.py get_route_info):")
+    rng = random.Random(11)
+    route_count = max(100000, max(sizes))
+    rows = synthetic_routes(route_count, rng)
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, 'routes.db')
+        start = time.perf_counter()
+        stored = route_store.build_route_db(rows, db_path)
+        build_s = time.perf_counter() - start
+
+        store = route_store.RouteStore(db_path)
+        start = time.perf_counter()
+        store.lookup(rows[0][0])
+        first_ms = (time.perf_counter() - start) * 1000.0
+        print(f"   {stored} routes: build {build_s:.2f}s | {os.path.getsize(db_path) / 1024 / 1024:.1f}MB"
+              f" | first lookup (lazy open) {first_ms:.2f}ms")
+
+        for size in sizes:
+            # Real batches repeat callsigns; draw from a pool a fifth the batch size
+            pool = [rng.choice(rows)[0] for _ in range(max(1, size // 5))]
+            callsigns = [rng.choice(pool) for _ in range(size)]
+
+            uncached_ms, found = time_call(lambda: [store.lookup(c) for c in callsigns], repeat=1)
+
+            def memoized():
+                memo = {}
+                for callsign in callsigns:
+                    if callsign not in memo:
+                        memo[callsign] = store.lookup(callsign)
+                    yield memo[callsign]
+
+            memo_ms, _ = time_call(lambda: list(memoized()), repeat=1)
+            print(f"   {size:>6} lookups: {uncached_ms:8.2f}ms ({uncached_ms * 1000.0 / size:5.2f}μs each)"
+                  f" | memoized {memo_ms:8.2f}ms | hits {sum(1 for route in found if route)}")
+    print()
+
+def peak_memory_mb(func, *args):
+    """Peak traced allocation (MB) during one call, timed separately since tracing slows it down"""
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024
+
+def bench_route_bulk(sizes):
+    """enhance_with_route_data vs the bulk in-place and columnar paths"""
+    print("✅ Route enhancement of large flight lists (route-enhancer.py):")
+    route_enhancer = load_script('route-enhancer.py', 'route_enhancer')
+    rng = random.Random(12)
+    rows = synthetic_routes(max(100000, max(sizes)), rng)
+    template = state_filter.filter_states(make_states(max(sizes)), -1, 10 ** 6)
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, 'routes.db')
+        route_store.build_route_db(rows, db_path)
+        route_store._route_store = route_store.RouteStore(db_path)
+
+        for size in sizes:
+            # Mostly distinct callsigns with some repeats, about a tenth unknown to the database
+            pool = [rng.choice(rows)[0] for _ in range(max(1, size * 9 // 10))] + ['N%dAB' % n for n in range(size // 10)]
+            flights = [dict(template[i % len(template)], callsign=rng.choice(pool)) for i in range(size)]
+            variants = [
+                ('per-flight copy', route_enhancer.enhance_with_route_data),
+                ('bulk in-place', route_enhancer.enhance_with_route_data_bulk),
+                ('bulk columnar', lambda batch: route_enhancer.enhance_with_route_data_bulk(batch, columnar=True))
+            ]
+            print(f"   {size:>6} flights:")
+            for name, func in variants:
+                elapsed_ms, _ = time_call(func, copy.deepcopy(flights), repeat=1)
+                peak_mb = peak_memory_mb(func, copy.deepcopy(flights))
+                print(f"      {name:<16} {elapsed_ms:9.2f}ms | {size / (elapsed_ms / 1000.0):>10,.0f} flights/s"
+                      f" | peak {peak_mb:7.2f}MB")
+        route_store._route_store = None
+    print()
+
+def bench_registry(sizes):
+    """Memory-mapped aircraft registry: build, open and lookups at 500k airframes"""
+    print("✅ Aircraft registry (aircraft_registry.py lookup):")
+    rng = random.Random(13)
+    type_codes = ['A320', 'A321', 'B738', 'B739', 'E75L', 'CRJ9', 'B77W', 'A359', 'C172', 'PC12']
+    airframe_count = max(500000, max(sizes))
+    addresses = rng.sample(range(0x1000000), airframe_count)
+    rows = [(f"{address:06x}", rng.choice(type_codes)) for address in addresses]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'aircraft-registry.bin')
+        start = time.perf_counter()
+        stored = aircraft_registry.build_registry(rows, path)
+        build_s = time.perf_counter() - start
+
+        registry = aircraft_registry.AircraftRegistry(path)
+        start = time.perf_counter()
+        registry.lookup(rows[0][0])
+        first_ms = (time.perf_counter() - start) * 1000.0
+        print(f"   {stored} airframes: build {build_s:.2f}s | {os.path.getsize(path) / 1024 / 1024:.1f}MB"
+              f" | first lookup (mmap open) {first_ms:.2f}ms")
+
+        for size in sizes:
+            # Half registered airframes, half random addresses that mostly miss
+            queries = [rng.choice(rows)[0] for _ in range(size // 2)]
+            queries += [f"{rng.randrange(0x1000000):06x}" for _ in range(size - len(queries))]
+            elapsed_ms, found = time_call(registry.lookup_many, queries, repeat=3)
+            print(f"   {size:>6} lookups: {elapsed_ms:8.2f}ms ({elapsed_ms * 1000.0 / size:5.2f}μs each)"
+                  f" | hits {len(found)}")
+    print()
+
+def bench_prediction(sizes):
+    """Dead-reckoning a snapshot forward (one batched great-circle pass)"""
+    print(f"✅ Dead reckoning (extrapolate_flights, NumPy {'on' if geo.NUMPY_AVAILABLE else 'off'}):")
+    for size in sizes:
+        flights = state_filter.filter_states(make_states(size), -1, 10 ** 6)
+        now = max(flight['time_position'] or 0 for flight in flights) + 30
+        elapsed_ms, predicted = time_call(dead_reckoning.extrapolate_flights, flights, now)
+        moved = sum(1 for flight in predicted if flight['predicted'])
+        print(f"   {len(flights):>6} flights: {elapsed_ms:8.2f}ms ({elapsed_ms * 1000.0 / max(1, len(flights)):5.2f}μs each)"
+              f" | moved {moved}")
+    print()
+
+def bench_tiles(sizes):
+    """Upstream queries and credits for N displays: one bbox query each vs shared tile snapshots"""
+    print("✅ Tile-based shared fetching (N home locations, 50km radius each):")
+    states = make_states(20000)
+    queries = []
+
+    def fetch(bbox):
+        queries.append(bbox)
+        lamin, lamax, lomin, lomax = bbox
+        return [state for state in states if state.latitude is not None
+                and lamin <= state.latitude <= lamax and lomin <= state.longitude <= lomax]
+
+    rng = random.Random(11)
+    for size in sizes:
+        bboxes = []
+        for _ in range(size):
+            lat, lon = 39.8561 + rng.uniform(-2.5, 2.5), -104.6737 + rng.uniform(-2.5, 2.5)
+            lat_delta, lon_delta = 50 / 111.0, 50 / (111.0 * abs(cos(radians(lat))))
+            bboxes.append({'lamin': lat - lat_delta, 'lamax': lat + lat_delta,
+                           'lomin': lon - lon_delta, 'lomax': lon + lon_delta})
+        per_display_credits = sum(poll_scheduler.credit_cost(bbox) for bbox in bboxes)
+
+        del queries[:]
+        fetcher = tile_fetcher.TileFetcher(fetch, ttl_s=60.0)
+        start = time.perf_counter()
+        wanted = set().union(*(fetcher.grid.tiles_for_bbox(bbox) for bbox in bboxes))
+        fetcher.states_for_tiles(wanted)
+        served = sum(len(fetcher.states_for_bbox(bbox)) for bbox in bboxes)
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        tile_credits = sum(poll_scheduler.credit_cost(dict(zip(('lamin', 'lamax', 'lomin', 'lomax'), bbox)))
+                           for bbox in queries)
+        print(f"   {size:>6} displays: per-display {size} queries / {per_display_credits} credits"
+              f" | tiles {len(queries)} queries / {tile_credits} credits over {len(wanted)} tiles"
+              f" | {elapsed_ms:8.2f}ms | served {served} states")
+    print()
+
+def bench_recorder(sizes):
+    """Appending polls to a columnar recording and querying a time window around a point"""
+    print(f"✅ State recorder (append + time/radius query, NumPy {'on' if state_recorder.NUMPY_AVAILABLE else 'off'}):")
+    for size in sizes:
+        rows = synthetic_states(size, spread_deg=5.0)
+        polls = 60
+        with tempfile.TemporaryDirectory() as directory:
+            recorder = state_recorder.StateRecorder(directory)
+            start = time.perf_counter()
+            for poll in range(polls):
+                recorder.append(rows, 1000.0 + poll * 10)
+            append_ms = (time.perf_counter() - start) * 1000.0 / polls
+            recorder.close()
+
+            recording = state_recorder.StateRecording(directory)
+            # Ten minutes out of the middle of the recording, 25km around the center
+            query_ms, matches = time_call(recording.query, 1200.0, 1400.0, 39.8561, -104.6737, 25.0, repeat=3)
+            size_mb = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)) / 1e6
+        print(f"   {size:>6} states x {polls} polls: append {append_ms:8.2f}ms/poll"
+              f" ({append_ms * 1000.0 / size:5.2f}μs/state) | query {query_ms:8.2f}ms | matched {len(matches)}"
+              f" | {size_mb:6.1f}MB ({size_mb * 1e6 / (size * polls):4.1f}B/state)")
+    print()
+
+SECTIONS = {
+    'filtering': bench_filtering,
+    'airports': bench_airports,
+    'routes': bench_routes,
+    'route-bulk': bench_route_bulk,
+    'registry': bench_registry,
+    'prediction': bench_prediction,
+    'tiles': bench_tiles,
+    'recorder': bench_recorder
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Python enhancer hot paths")
+    parser.add_argument('sections', nargs='*', help=f"sections to run: {', '.join(SECTIONS)} (default: all)")
+    parser.add_argument('--sizes', default='1000,10000,50000', help="comma-separated input sizes")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.sections if name not in SECTIONS]
+    if unknown:
+        parser.error(f"unknown section(s): {', '.join(unknown)}")
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    print('⏱️  Python Enhancer Performance Benchmark')
+    print('=========================================')
+    for name in args.sections or SECTIONS:
+        SECTIONS[name](sizes)
+
+if __name__ == "__main__":
+    main()
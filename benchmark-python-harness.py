@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Benchmark Harness: Python Enhancers Against a Fake OpenSky API
+
+Runs fetch_opensky_flights, enhance_flights_with_realistic_data and
+enhance_with_route_data end to end against api/fake_opensky_server.py
+(synthetic aircraft, or a recorded snapshot with --replay) and writes a JSON
+report with throughput, p50/p95/p99 latency, upstream call counts and peak RSS
+per case, so results can be compared between releases. Every case runs in a
+fresh interpreter so its peak RSS is its own.
+
+    python3 benchmark-python-harness.py [case ...] [--sizes 10,100,1000,10000,50000]
+        [--latency-ms 0] [--error-rate 0] [--replay snapshot.json] [--case-timeout 1800] [--output report.json]
+"""
+
+import argparse
+import importlib.util
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.join(ROOT_DIR, 'api')
+sys.path.insert(0, API_DIR)
+
+from fake_opensky_server import start_fake_opensky_server
+from geo import haversine_km
+from instrumentation import set_log_level
+
+CASES = ['fetch', 'enhance', 'routes']
+RESULT_POLL_S = 1.0
+
+def load_script(filename, module_name):
+    """Import one of the hyphen-named api/ scripts as a module"""
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(API_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+def latency_summary(latencies_s):
+    latencies = sorted(latency * 1000.0 for latency in latencies_s)
+    return {
+        'samples': len(latencies),
+        'p50_ms': round(percentile(latencies, 0.50), 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95), 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99), 3) if latencies else None
+    }
+
+def peak_rss_mb():
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def iterations_for(size):
+    """Repeat small cases so their percentiles mean something"""
+    return max(3, min(50, 10000 // max(1, size)))
+
+def run_fetch(enhancer, size, options):
+    center_lat, center_lon, radius_km = options['area']
+    latencies, returned = [], 0
+    for _ in range(iterations_for(size)):
+        start = time.perf_counter()
+        flights = enhancer.fetch_opensky_flights(center_lat, center_lon, radius_km, 0, 60000)
+        latencies.append(time.perf_counter() - start)
+        returned = len(flights)
+    return latencies, size * len(latencies), {'flights_returned': returned}
+
+def run_enhance(enhancer, size, options):
+    rows = options['rows']
+    icaos = [row[0] for row in rows]
+    callsigns = {row[0]: (row[1] or '').strip() for row in rows}
+    # As in bbox requests: categories come from the snapshot, so only tracks go upstream
+    categories = {row[0]: row[17] if len(row) > 17 else 0 for row in rows}
+
+    # Time each aircraft's enhancement by wrapping the per-flight function
+    latencies = []
+    per_flight = enhancer.enhance_flight_with_opensky_data
+
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return per_flight(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    enhancer.enhance_flight_with_opensky_data = timed
+    start = time.perf_counter()
+    enhanced = enhancer.enhance_flights_with_realistic_data(
+        icaos, callsigns, known_categories=categories, max_in_flight=options['max_in_flight']
+    )
+    batch_s = time.perf_counter() - start
+    with_track = sum(1 for data in enhanced.values() if data.get('track_points'))
+    return latencies, len(icaos), {'batch_s': round(batch_s, 3), 'flights_with_track': with_track}
+
+def run_routes(route_enhancer, size, options):
+    rows = options['rows']
+    flights = [
+        {'icao24': rows[i % len(rows)][0], 'callsign': (rows[i % len(rows)][1] or '').strip()}
+        for i in range(size)
+    ]
+    latencies = []
+    for _ in range(iterations_for(size)):
+        start = time.perf_counter()
+        route_enhancer.enhance_with_route_data(flights)
+        latencies.append(time.perf_counter() - start)
+    return latencies, size * len(latencies), {}
+
+def run_case(case, size, options, results):
+    """Child-process entry point: import the enhancer fresh, run one case, report through the queue"""
+    if not options['verbose']:
+        # Per-flight stderr logging would dominate the timings
+        set_log_level('quiet')
+
+    if case == 'routes':
+        module = load_script('route-enhancer.py', 'route_enhancer')
+        runner = run_routes
+    else:
+        module = load_script('python-flight-enhancer.py', 'python_flight_enhancer')
+        module.get_opensky_client(options=options['opensky'])
+        runner = run_fetch if case == 'fetch' else run_enhance
+
+    baseline_rss = peak_rss_mb()
+    start = time.perf_counter()
+    latencies, items, extra = runner(module, size, options)
+    elapsed_s = time.perf_counter() - start
+
+    results.put(dict({
+        'case': case,
+        'size': size,
+        'elapsed_s': round(elapsed_s, 3),
+        'throughput_per_s': round(items / elapsed_s, 1) if elapsed_s else None,
+        'latency': latency_summary(latencies),
+        'baseline_rss_mb': baseline_rss,
+        'peak_rss_mb': peak_rss_mb()
+    }, **extra))
+
+def wait_for_result(child, results, timeout_s):
+    """
+    The child's result, or a failed-case record if it dies (crash, OOM kill) or
+    runs past timeout_s without reporting, instead of blocking forever
+    """
+    deadline = time.monotonic() + timeout_s
+    while True:
+        try:
+            return results.get(timeout=RESULT_POLL_S)
+        except queue.Empty:
+            pass
+        if not child.is_alive():
+            # A result put just before exit may still be in the pipe
+            try:
+                return results.get(timeout=RESULT_POLL_S)
+            except queue.Empty:
+                return {'error': f"child exited with code {child.exitcode} without a result", 'exitcode': child.exitcode}
+        if time.monotonic() > deadline:
+            child.terminate()
+            child.join()
+            return {'error': f"timed out after {timeout_s:g}s", 'exitcode': child.exitcode}
+
+def area_around(rows):
+    """Center and radius that cover every positioned state in a snapshot"""
+    positioned = [(row[6], row[5]) for row in rows if row[6] is not None and row[5] is not None]
+    if not positioned:
+        return 39.8561, -104.6737, 100.0
+    lats = sorted(lat for lat, _ in positioned)
+    lons = sorted(lon for _, lon in positioned)
+    center = (lats[len(lats) // 2], lons[len(lons) // 2])
+    radius_km = max(haversine_km(center[0], center[1], lat, lon) for lat, lon in positioned) + 1.0
+    return center[0], center[1], round(radius_km, 1)
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def package_version():
+    try:
+        with open(os.path.join(ROOT_DIR, 'package.json')) as f:
+            return json.load(f).get('version')
+    except (OSError, ValueError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the Python enhancers against a fake OpenSky API")
+    parser.add_argument('cases', nargs='*', help=f"cases to run: {', '.join(CASES)} (default: all)")
+    parser.add_argument('--sizes', default='10,100,1000,10000,50000', help="comma-separated input sizes")
+    parser.add_argument('--latency-ms', type=float, default=0, help="delay the fake API adds to every response")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of fake API responses that fail")
+    parser.add_argument('--replay', help="snapshot recorded with fake_opensky_server.py --record")
+    parser.add_argument('--max-in-flight', type=int, default=16, help="concurrent track fetches")
+    parser.add_argument('--requests-per-second', type=float, default=1e6,
+                        help="client-side pacing (default: effectively unpaced)")
+    parser.add_argument('--case-timeout', type=float, default=1800.0,
+                        help="seconds before a case that has not reported is killed and recorded as failed")
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    parser.add_argument('--verbose', action='store_true', help="keep the enhancers' stderr logging")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.cases if name not in CASES]
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(unknown)}")
+
+    server = start_fake_opensky_server(latency_ms=args.latency_ms, error_rate=args.error_rate, replay=args.replay)
+    print(f"🛩️ Fake OpenSky API on {server.api_url}", file=sys.stderr)
+
+    report = {
+        'benchmark': 'python-enhancers',
+        'version': package_version(),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'server': {'latency_ms': args.latency_ms, 'error_rate': args.error_rate, 'replay': args.replay},
+        'results': []
+    }
+
+    context = multiprocessing.get_context('spawn')
+    for case in args.cases or CASES:
+        for size in [int(size) for size in args.sizes.split(',')]:
+            if not args.replay:
+                server.aircraft = size
+            rows = server.states()
+            if case == 'enhance':
+                rows = rows[:size]
+            if case != 'routes':
+                # A replayed snapshot may hold fewer aircraft than asked for
+                size = len(rows)
+            options = {
+                'rows': [] if case == 'fetch' else rows,
+                'area': area_around(rows),
+                'max_in_flight': args.max_in_flight,
+                'opensky': {
+                    'api_url': server.api_url,
+                    'requests_per_second': args.requests_per_second,
+                    'burst': args.requests_per_second
+                },
+                'verbose': args.verbose
+            }
+
+            before = server.snapshot_stats()
+            results = context.Queue()
+            child = context.Process(target=run_case, args=(case, size, options, results))
+            child.start()
+            result = wait_for_result(child, results, args.case_timeout)
+            child.join()
+            after = server.snapshot_stats()
+
+            result['upstream_calls'] = {key: after[key] - before[key] for key in after}
+            if 'error' in result:
+                result = dict({'case': case, 'size': size, 'failed': True}, **result)
+                report['results'].append(result)
+                print(f"❌ {case:<8} {size:>6}: {result['error']}", file=sys.stderr)
+                continue
+            report['results'].append(result)
+            print(f"✅ {case:<8} {size:>6}: {result['throughput_per_s']:>12,.1f}/s"
+                  f" | p50 {result['latency']['p50_ms']}ms p95 {result['latency']['p95_ms']}ms"
+                  f" p99 {result['latency']['p99_ms']}ms | upstream {result['upstream_calls']['requests']}"
+                  f" | peak RSS {result['peak_rss_mb']}MB", file=sys.stderr)
+
+    server.shutdown()
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        print(f"📄 Report written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()